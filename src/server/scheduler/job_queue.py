@@ -0,0 +1,274 @@
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+
+from scheduler import ScheduleCancelledError
+from scheduler_api import generate_schedule
+
+logger = logging.getLogger("SchedulerJobQueue")
+
+# 优先级：数值越小越先执行
+PRIORITIES = {
+    "interactive": 0,
+    "bulk": 1,
+}
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+def request_key(employees_data: List[Dict[str, Any]], shifts_data: List[Dict[str, Any]],
+                sa_config: Optional[Dict[str, Any]], cost_params: Optional[Dict[str, Any]]) -> str:
+    """计算排班请求的去重键（规范化 JSON 的 SHA-256）"""
+    canonical = json.dumps(
+        {"employees": employees_data, "shifts": shifts_data, "sa_config": sa_config, "cost_params": cost_params},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _run_job(request: Dict[str, Any], cancel_event: Any) -> Dict[str, Any]:
+    """在进程池中执行排班任务，温度步之间检查取消事件"""
+    return generate_schedule(
+        request["employees"], request["shifts"], request["sa_config"], request["cost_params"],
+        cancel_check=cancel_event.is_set
+    )
+
+
+@dataclass
+class Job:
+    """排班任务"""
+    job_id: str
+    key: str
+    priority: str
+    request: Optional[Dict[str, Any]]  # 任务结束后释放
+    future: asyncio.Future
+    cancel_event: Any
+    status: str = JOB_QUEUED
+    subscribers: int = 1  # 合并到该任务的提交次数
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobQueue:
+    """基于 asyncio 的排班任务队列
+
+    - 按优先级（interactive 优先于 bulk）调度，同优先级先进先出；
+    - 相同请求在排队或运行中时合并为同一个任务；
+    - 最多 max_workers 个任务同时在进程池中运行；
+    - 合并的提交优先级更高时，排队中的任务提升到该优先级；
+    - 取消排队中的任务直接丢弃，运行中的任务在求解的下一个温度步之间中止；
+    - 已结束的任务保留 retention_seconds 秒供查询结果，之后被清除。
+
+    用法:
+        async with JobQueue(max_workers=2) as queue:
+            job_id = await queue.submit(employees, shifts, priority="interactive")
+            result = await queue.result(job_id)
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue_size: int = 100, retention_seconds: float = 600.0):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._inflight: Dict[str, str] = {}  # 去重键 -> 排队或运行中的任务ID
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._dispatchers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """启动进程池和调度协程"""
+        # 提升优先级会留下过期条目，因此队列本身不设上限，排队任务数在 submit 中限制
+        self._queue = asyncio.PriorityQueue()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        # 取消事件需要跨进程传递，由 Manager 进程托管
+        self._manager = multiprocessing.Manager()
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.max_workers)]
+        logger.info(f"任务队列已启动，进程数: {self.max_workers}")
+
+    async def close(self) -> None:
+        """取消所有未完成的任务并关闭进程池"""
+        for job in self._jobs.values():
+            if job.status in (JOB_QUEUED, JOB_RUNNING):
+                job.subscribers = 1
+                self.cancel(job.job_id)
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self._manager.shutdown()
+        logger.info("任务队列已关闭")
+
+    async def __aenter__(self) -> 'JobQueue':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def submit(
+        self,
+        employees_data: List[Dict[str, Any]],
+        shifts_data: List[Dict[str, Any]],
+        sa_config: Optional[Dict[str, Any]] = None,
+        cost_params: Optional[Dict[str, Any]] = None,
+        priority: str = "bulk"
+    ) -> str:
+        """提交排班任务，返回任务ID；与排队或运行中的相同请求合并"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的优先级: {priority}")
+
+        self._evict_finished()
+        key = request_key(employees_data, shifts_data, sa_config, cost_params)
+        existing_id = self._inflight.get(key)
+        if existing_id is not None:
+            job = self._jobs[existing_id]
+            job.subscribers += 1
+            if job.status == JOB_QUEUED and PRIORITIES[priority] < PRIORITIES[job.priority]:
+                # 以更高优先级重新入队，原条目由调度协程跳过
+                job.priority = priority
+                self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), job.job_id))
+                logger.debug(f"任务 {existing_id} 提升为 {priority} 优先级")
+            logger.debug(f"合并重复请求到任务 {existing_id}")
+            return existing_id
+
+        if sum(1 for job in self._jobs.values() if job.status == JOB_QUEUED) >= self.max_queue_size:
+            raise ValueError("任务队列已满")
+
+        # 队列本身提供并行度，任务内部只使用单进程求解以便响应取消
+        sa_config = {**(sa_config or {}), "workers": 1}
+        future = asyncio.get_running_loop().create_future()
+        # 避免无人读取结果的失败任务产生告警
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            key=key,
+            priority=priority,
+            request={"employees": employees_data, "shifts": shifts_data,
+                     "sa_config": sa_config, "cost_params": cost_params},
+            future=future,
+            cancel_event=self._manager.Event(),
+        )
+        self._jobs[job.job_id] = job
+        self._inflight[key] = job.job_id
+        self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), job.job_id))
+        logger.debug(f"提交任务 {job.job_id}，优先级: {priority}")
+        return job.job_id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """查询任务状态"""
+        job = self._get_job(job_id)
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "priority": job.priority,
+            "subscribers": job.subscribers,
+            "error": job.error,
+            "submitted_at": job.submitted_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """取消一次提交；合并的提交全部取消后才真正中止任务
+
+        Returns:
+            任务是否被中止
+        """
+        job = self._get_job(job_id)
+        if job.status not in (JOB_QUEUED, JOB_RUNNING):
+            return False
+
+        job.subscribers -= 1
+        if job.subscribers > 0:
+            logger.debug(f"任务 {job_id} 仍有 {job.subscribers} 个提交，暂不取消")
+            return False
+
+        self._inflight.pop(job.key, None)
+        if job.status == JOB_QUEUED:
+            self._finish(job, JOB_CANCELLED, exception=ScheduleCancelledError("排班求解已取消"))
+        else:
+            # 运行中的任务由求解进程在温度步之间检查到事件后中止
+            job.cancel_event.set()
+        logger.info(f"取消任务 {job_id}")
+        return True
+
+    async def result(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """等待任务完成并返回排班结果；任务被取消时抛出 ScheduleCancelledError"""
+        job = self._get_job(job_id)
+        return await asyncio.wait_for(asyncio.shield(job.future), timeout)
+
+    def _get_job(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"任务不存在: {job_id}")
+        return job
+
+    def _evict_finished(self) -> None:
+        """清除结束超过 retention_seconds 秒的任务及其请求和结果"""
+        deadline = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < deadline]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired:
+            logger.debug(f"清除{len(expired)}个已结束的任务")
+
+    def _finish(self, job: Job, status: str, result: Optional[Dict[str, Any]] = None,
+                exception: Optional[BaseException] = None) -> None:
+        """记录任务结束状态并完成 future；请求数据不再需要，随即释放"""
+        job.status = status
+        job.finished_at = time.time()
+        job.request = None
+        if self._inflight.get(job.key) == job.job_id:
+            del self._inflight[job.key]
+        if job.future.done():
+            return
+        if exception is not None:
+            job.error = str(exception)
+            job.future.set_exception(exception)
+        else:
+            job.future.set_result(result)
+
+    async def _dispatch(self) -> None:
+        """调度协程：按优先级取出任务并交给进程池执行"""
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            # 跳过已取消、已清除或因提升优先级而过期的条目
+            if job is None or job.status != JOB_QUEUED:
+                continue
+
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            logger.debug(f"开始执行任务 {job_id}")
+            try:
+                result = await loop.run_in_executor(self._executor, _run_job, job.request, job.cancel_event)
+            except ScheduleCancelledError as e:
+                self._finish(job, JOB_CANCELLED, exception=e)
+            except asyncio.CancelledError:
+                job.cancel_event.set()
+                self._finish(job, JOB_CANCELLED, exception=ScheduleCancelledError("任务队列已关闭"))
+                raise
+            except Exception as e:
+                logger.error(f"任务 {job_id} 执行失败: {str(e)}")
+                self._finish(job, JOB_FAILED, exception=e)
+            else:
+                self._finish(job, JOB_COMPLETED, result=result)
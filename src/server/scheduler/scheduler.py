@@ -1,10 +1,15 @@
 import os
+import json
 import math
+import hashlib
+import tempfile
 import copy
+import time
 import random
+import bisect
 import logging
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Set, Any, Optional
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Tuple, Set, Any, Optional, Callable
 
 # 配置日志
 logging.basicConfig(
@@ -27,6 +32,38 @@ SA_CONFIG = {
     "cooling_rate": 0.95,
     "iter_per_temp": 100,
     "iterations": 50,
+    "optimality_gap": 0.0,  # 最优解与下界的相对差距不超过该值时提前结束
+    "workers": 1,  # 并行求解的进程数，大于1时使用 shared_problem.solve_parallel
+    "equivalence_reduction": False,  # 是否先把可互换员工归为等价类，在类计数上做模拟退火
+}
+
+# 检查点参数（模拟退火）
+CHECKPOINT_CONFIG = {
+    "checkpoint_interval": 0,  # 每隔多少个温度步写一次检查点，0 表示不写
+    "checkpoint_file": "sa_checkpoint.json",  # 检查点文件名（位于 DATA_DIR 下）
+    "resume": False,  # 是否从检查点继续求解
+    "checkpoint_tag": "",  # 区分同一问题的多个并行求解（如 solve_parallel 的第几次求解）
+}
+
+# 禁忌搜索参数（通过 sa_config 传入，engine 为 "tabu" 时生效）
+TABU_CONFIG = {
+    "engine": "sa",  # 搜索引擎: "sa" 模拟退火, "tabu" 禁忌搜索, "lns" 大邻域搜索
+    "tabu_iterations": 300,  # 禁忌搜索步数
+    "tabu_neighborhood_size": 30,  # 每步采样的邻域解数量
+    "tabu_tenure": 15,  # (员工, 班次) 对的禁忌步数
+    "tabu_max_no_improve": 100,  # 连续多少步最优解未改进则提前结束
+}
+
+# 大邻域搜索参数（engine 为 "lns" 时生效，温度参数沿用 SA_CONFIG）
+LNS_CONFIG = {
+    "lns_iter_per_temp": 10,  # 每个温度下的破坏-重建次数
+    "lns_destroy_fraction": 0.1,  # 随机破坏模式下破坏的班次比例
+}
+
+# 局部修复参数
+REPAIR_CONFIG = {
+    "repair_iterations": 2000,  # 局部搜索最大迭代次数
+    "repair_time_limit": 0.5,  # 局部搜索时间上限（秒）
 }
 
 # 成本参数默认值
@@ -36,6 +73,7 @@ DEFAULT_COST_PARAMS = {
     "time_pref_violation": 5,
     "daily_hours_violation": 20,
     "weekly_hours_violation": 50,
+    "double_booking": 200,
 }
 
 
@@ -51,6 +89,7 @@ class Employee:
     max_weekly_hours: float  # 每周最大工时
     phone: str = ""
     email: str = ""
+    id: Optional[Any] = None  # 员工ID，未提供时使用在员工列表中的下标
 
 
 @dataclass
@@ -62,6 +101,11 @@ class Shift:
     required_positions: Dict[str, int]  # 职位: 需要人数
     # 员工的职位有：门店经理，副经理，小组长，店员（收银，导购，库房）
     store: str  # 门店
+    id: Optional[Any] = None  # 班次ID，未提供时使用在班次列表中的下标
+
+
+class ScheduleCancelledError(Exception):
+    """排班求解被取消"""
 
 
 def time_to_minutes(time_str: str) -> int:
@@ -99,15 +143,155 @@ def calculate_shift_duration(shift: Shift) -> float:
         raise ValueError(f"计算班次时长失败: {str(e)}")
 
 
+def shift_interval(shift: Shift) -> Tuple[int, int, int]:
+    """返回班次的 (日期, 开始分钟, 结束分钟)"""
+    return shift.day, time_to_minutes(shift.start_time), time_to_minutes(shift.end_time)
+
+
+class EmployeeDayIntervalIndex:
+    """员工-日期区间索引
+
+    按 (员工, 日期) 维护按开始时间排序的班次区间，以及前缀最大结束时间，
+    使得判断某个区间是否与已有班次重叠只需一次二分查找。
+    区间以排班方案中的班次下标标识。
+    """
+
+    def __init__(self):
+        # (员工名, 日期) -> ([开始分钟], [结束分钟], [班次下标], [前缀最大结束分钟])
+        self._buckets: Dict[Tuple[str, int], Tuple[List[int], List[int], List[int], List[int]]] = {}
+
+    @classmethod
+    def from_schedule(cls, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> 'EmployeeDayIntervalIndex':
+        """根据排班方案构建索引"""
+        index = cls()
+        for idx, (shift, assignment) in enumerate(schedule):
+            day, start, end = shift_interval(shift)
+            for workers in assignment.values():
+                for w in workers:
+                    index.add(w.name, day, start, end, idx)
+        return index
+
+    def _refresh_prefix(self, bucket, pos: int) -> None:
+        """从 pos 开始重新计算前缀最大结束时间"""
+        _, ends, _, prefix = bucket
+        running = prefix[pos - 1] if pos > 0 else -1
+        for i in range(pos, len(ends)):
+            running = max(running, ends[i])
+            prefix[i] = running
+
+    def add(self, name: str, day: int, start: int, end: int, shift_idx: int) -> None:
+        """登记员工在某班次的区间"""
+        bucket = self._buckets.setdefault((name, day), ([], [], [], []))
+        starts, ends, idxs, prefix = bucket
+        pos = bisect.bisect_right(starts, start)
+        starts.insert(pos, start)
+        ends.insert(pos, end)
+        idxs.insert(pos, shift_idx)
+        prefix.insert(pos, end)
+        self._refresh_prefix(bucket, pos)
+
+    def remove(self, name: str, day: int, shift_idx: int) -> None:
+        """移除员工在某班次的区间（同一班次只移除一条）"""
+        bucket = self._buckets.get((name, day))
+        if not bucket:
+            return
+        starts, ends, idxs, prefix = bucket
+        if shift_idx not in idxs:
+            return
+        pos = idxs.index(shift_idx)
+        for seq in bucket:
+            del seq[pos]
+        if not starts:
+            del self._buckets[(name, day)]
+            return
+        self._refresh_prefix(bucket, pos)
+
+    def conflicts(self, name: str, day: int, start: int, end: int) -> List[int]:
+        """返回与给定区间重叠的班次下标"""
+        bucket = self._buckets.get((name, day))
+        if not bucket:
+            return []
+        starts, ends, idxs, prefix = bucket
+        # 只有开始时间早于 end 的区间才可能重叠
+        i = bisect.bisect_left(starts, end) - 1
+        result = []
+        while i >= 0 and prefix[i] > start:
+            if ends[i] > start:
+                result.append(idxs[i])
+            i -= 1
+        return result
+
+    def has_conflict(self, name: str, day: int, start: int, end: int,
+                     ignore: Optional[int] = None) -> bool:
+        """判断给定区间是否与员工当天已有班次重叠，可忽略指定班次"""
+        bucket = self._buckets.get((name, day))
+        if not bucket:
+            return False
+        starts, ends, idxs, prefix = bucket
+        i = bisect.bisect_left(starts, end) - 1
+        if i < 0 or prefix[i] <= start:
+            return False
+        if ignore is None:
+            return True
+        return any(idx != ignore for idx in self.conflicts(name, day, start, end))
+
+
+def count_overlaps(intervals: List[Tuple[int, int]]) -> int:
+    """统计一组区间中与更早开始的区间重叠的区间个数（按开始、结束时间排序扫描）"""
+    count = 0
+    running_end = -1
+    for start, end in sorted(intervals):
+        if start < running_end:
+            count += 1
+        running_end = max(running_end, end)
+    return count
+
+
+def find_double_bookings(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Tuple[str, int, List[int]]]:
+    """找出同一员工在同一天被安排到重叠班次的情况
+
+    按开始、结束时间顺序登记分配，返回 (员工名, 班次下标, 与之重叠的更早开始的班次下标) 列表，
+    每个多余的分配记录一次；结果与排班方案中班次的排列顺序无关，与 count_overlaps 一致。
+    """
+    entries = []
+    for idx, (shift, assignment) in enumerate(schedule):
+        day, start, end = shift_interval(shift)
+        for workers in assignment.values():
+            for w in workers:
+                entries.append((start, end, idx, w.name, day))
+    entries.sort(key=lambda entry: entry[:3])
+    
+    index = EmployeeDayIntervalIndex()
+    double_bookings = []
+    for start, end, idx, name, day in entries:
+        overlapping = index.conflicts(name, day, start, end)
+        if overlapping:
+            double_bookings.append((name, idx, overlapping))
+        index.add(name, day, start, end, idx)
+    return double_bookings
+
+
 class SchedulingAlgorithm:
     """排班算法类"""
     
     def __init__(self, employees: List[Employee], shifts: List[Shift], 
-                 sa_config: Optional[Dict[str, Any]] = None, cost_params: Optional[Dict[str, Any]] = None):
+                 sa_config: Optional[Dict[str, Any]] = None, cost_params: Optional[Dict[str, Any]] = None,
+                 cancel_check: Optional[Callable[[], bool]] = None):
         self.employees = employees
         self.shifts = shifts
-        self.sa_config = sa_config if sa_config is not None else SA_CONFIG
-        self.cost_params = cost_params if cost_params is not None else DEFAULT_COST_PARAMS
+        # 未提供的参数使用默认值补齐
+        self.sa_config = {**SA_CONFIG, **CHECKPOINT_CONFIG, **TABU_CONFIG, **LNS_CONFIG, **REPAIR_CONFIG, **(sa_config or {})}
+        self.cost_params = {**DEFAULT_COST_PARAMS, **(cost_params or {})}
+        # 取消检查回调，返回 True 时在下一个检查点中止求解
+        self.cancel_check = cancel_check
+        
+        # 补齐缺失的ID，输出时以ID引用员工和班次
+        for i, e in enumerate(self.employees):
+            if e.id is None:
+                e.id = i
+        for i, shift in enumerate(self.shifts):
+            if shift.id is None:
+                shift.id = i
         
         # 确保数据目录存在
         os.makedirs(DATA_DIR, exist_ok=True)
@@ -121,8 +305,31 @@ class SchedulingAlgorithm:
             self.employee_store_position_map[key].append(e)
         
         logger.debug(f"员工数据预处理完成，共有{len(self.employee_store_position_map)}种门店-职位组合")
+        
+        # 紧凑编码使用的下标：员工按输入顺序，职位按名称排序
+        self.employee_index = {e.name: i for i, e in enumerate(self.employees)}
+        self.positions = sorted(
+            {p for shift in self.shifts for p in shift.required_positions} | {e.position for e in self.employees}
+        )
+        self.position_index = {p: i for i, p in enumerate(self.positions)}
         self.best_solution = None
         self.best_cost = float('inf')
+        
+        # 区间索引缓存：索引对应的排班方案，以及待应用到子方案的增量变更
+        self._interval_index = None
+        self._interval_index_owner = None
+        self._pending_index_changes = None
+        # 最近一次生成相邻解时改动的区间，供禁忌搜索识别变更的 (员工, 班次) 对
+        self._last_neighbor_changes = []
+        
+        # 职位稀缺度（首次使用时计算）
+        self._position_scarcity = None
+        
+        # 成本下界（首次使用时计算）
+        self._lower_bound = None
+        
+        # 问题指纹（首次使用时计算）
+        self._fingerprint = None
         logger.info('初始化排班算法...')
     
     def _calculate_position_demand(self) -> Dict[str, int]:
@@ -150,12 +357,117 @@ class SchedulingAlgorithm:
                 scarcity[position] = 0  # 极度稀缺
         return scarcity
     
+    def compute_lower_bound(self) -> float:
+        """计算排班成本的下界
+        
+        按门店-职位分组独立估计（不同组的员工与岗位互不相交，成本可以相加）：
+        1. 班次需求人数超过该组员工总数的部分必然缺员；
+        2. 其余可覆盖岗位，每个岗位至少付出「缺员惩罚」与「组内员工最小偏好违反成本」中的较小者；
+        3. 可覆盖岗位总工时超出组内员工每周工时上限之和的部分，
+           只能通过缺员、让员工超出周工时或重复排班（时间重叠）来消化，按单位工时的最低代价做线性松弛。
+           缺员惩罚高于重复排班惩罚时，重复排班可能更便宜，因此单位工时代价不超过重复排班的代价。
+        2 与 3 可能计入同一批缺员，因此取两者较大值。
+        """
+        if self._lower_bound is not None:
+            return self._lower_bound
+        
+        understaff = self.cost_params["understaff_penalty"]
+        weekly_penalty = self.cost_params["weekly_hours_violation"]
+        double_booking = self.cost_params["double_booking"]
+        
+        # (门店, 职位) -> [(班次, 需求人数)]
+        demand_by_group: Dict[Tuple[str, str], List[Tuple[Shift, int]]] = {}
+        for shift in self.shifts:
+            for position, count in shift.required_positions.items():
+                if count > 0:
+                    demand_by_group.setdefault((shift.store, position), []).append((shift, count))
+        
+        lower_bound = 0.0
+        for key, demands in demand_by_group.items():
+            pool = self.employee_store_position_map.get(key, [])
+            group_bound = 0.0
+            pref_bound = 0.0
+            covered_hours = 0.0
+            max_duration = 0.0
+            # 每天被该组班次覆盖的时间段，员工一周最多只能工作这么久
+            day_intervals: Dict[int, List[Tuple[int, int]]] = {}
+            
+            for shift, count in demands:
+                duration = calculate_shift_duration(shift)
+                coverable = min(count, len(pool))
+                group_bound += (count - coverable) * understaff
+                if coverable == 0:
+                    continue
+                
+                # 该班次上任一员工的最小偏好违反成本
+                min_pref_cost = min(
+                    self._check_workday_preference(e, shift, []) + self._check_time_preference(e, shift, [])
+                    for e in pool
+                )
+                pref_bound += coverable * min(understaff, min_pref_cost)
+                
+                covered_hours += coverable * duration
+                max_duration = max(max_duration, duration)
+                day, start, end = shift_interval(shift)
+                day_intervals.setdefault(day, []).append((start, end))
+            
+            if pool and covered_hours > 0:
+                # 各天班次时间段并集的总时长
+                union_hours = 0.0
+                for intervals in day_intervals.values():
+                    intervals.sort()
+                    cur_start, cur_end = intervals[0]
+                    for start, end in intervals[1:]:
+                        if start > cur_end:
+                            union_hours += (cur_end - cur_start) / 60.0
+                            cur_start, cur_end = start, end
+                        else:
+                            cur_end = max(cur_end, end)
+                    union_hours += (cur_end - cur_start) / 60.0
+                
+                capacity = sum(min(e.max_weekly_hours, union_hours) for e in pool)
+                excess_hours = covered_hours - capacity
+                if excess_hours > 0:
+                    # 单位工时的最低代价：缺员、重复排班（每次重叠最多多出一个班次的工时），
+                    # 或让某位员工超出周工时后多承担的工时
+                    unit_cost = min(understaff, double_booking) / max_duration
+                    extra_hours = max(union_hours - min(e.max_weekly_hours, union_hours) for e in pool)
+                    if extra_hours > 0:
+                        unit_cost = min(unit_cost, weekly_penalty / extra_hours)
+                    hours_bound = excess_hours * unit_cost
+                else:
+                    hours_bound = 0.0
+                group_bound += max(pref_bound, hours_bound)
+            
+            lower_bound += group_bound
+        
+        logger.info(f"成本下界: {lower_bound:.2f}")
+        self._lower_bound = lower_bound
+        return lower_bound
+    
+    def optimality_gap(self, cost: float) -> float:
+        """计算成本与下界的相对差距"""
+        if cost <= 0:
+            return 0.0
+        return max(0.0, (cost - self.compute_lower_bound()) / cost)
+    
+    def _reached_optimality_gap(self, cost: float) -> bool:
+        """判断是否已达到配置的最优性差距，可提前结束搜索"""
+        return self.optimality_gap(cost) <= self.sa_config["optimality_gap"]
+    
+    def _shift_scarcity_key(self, shift: Shift, position_scarcity: Dict[str, float]) -> float:
+        """班次的稀缺度排序键：所需职位中最稀缺职位的稀缺度"""
+        return min([position_scarcity.get(p, float('inf')) for p in shift.required_positions.keys()], default=float('inf'))
+    
+    def _check_cancelled(self) -> None:
+        """协作式取消检查点"""
+        if self.cancel_check is not None and self.cancel_check():
+            logger.info("排班求解已取消")
+            raise ScheduleCancelledError("排班求解已取消")
+    
     def _sort_shifts_by_scarcity(self, position_scarcity: Dict[str, float]) -> List[Shift]:
         """按稀缺度对班次进行排序（先处理包含稀缺职位的班次）"""
-        return sorted(
-            self.shifts,
-            key=lambda s: min([position_scarcity.get(p, float('inf')) for p in s.required_positions.keys()], default=float('inf'))
-        )
+        return sorted(self.shifts, key=lambda s: self._shift_scarcity_key(s, position_scarcity))
     
     def _sort_positions_by_scarcity(self, positions, position_scarcity: Dict[str, float]):
         """按稀缺度对职位进行排序（先分配稀缺职位）"""
@@ -191,53 +503,92 @@ class SchedulingAlgorithm:
         scored_candidates.sort(key=lambda x: x[1], reverse=True)
         return scored_candidates
     
-    def generate_initial_solution(self) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
-        """生成初始解"""
-        logger.info("开始生成初始解...")
-        schedule = []
-        
-        # 计算职位稀缺度
-        position_demand = self._calculate_position_demand()
-        position_supply = self._calculate_position_supply()
-        position_scarcity = self._calculate_position_scarcity(position_demand, position_supply)
+    def _get_position_scarcity(self) -> Dict[str, float]:
+        """计算（并缓存）职位稀缺度"""
+        if self._position_scarcity is None:
+            position_demand = self._calculate_position_demand()
+            position_supply = self._calculate_position_supply()
+            self._position_scarcity = self._calculate_position_scarcity(position_demand, position_supply)
+            logger.debug(f"职位稀缺度: {self._position_scarcity}")
+        return self._position_scarcity
+    
+    def _greedy_fill(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]],
+                     targets: Dict[int, Optional[Set[str]]], shuffle: bool = False) -> None:
+        """按稀缺度贪心补齐指定班次的分配（原地修改 schedule）
         
-        logger.debug(f"职位稀缺度: {position_scarcity}")
+        Args:
+            schedule: 排班方案，未列入 targets 的分配视为固定
+            targets: 班次下标 -> 需要补齐的职位集合（None 表示全部职位）
+            shuffle: 是否在评分前打乱候选员工，使同分员工的选择随机化
+        """
+        position_scarcity = self._get_position_scarcity()
         
-        # 跟踪每个员工的已分配工时和工作日
+        # 跟踪每个员工的已分配工时和工作日，以及区间索引（避免同一员工被安排到重叠班次）
         employee_assigned_hours = {e.name: 0.0 for e in self.employees}  # 修改为float类型
         employee_assigned_days = {e.name: set() for e in self.employees}
+        interval_index = EmployeeDayIntervalIndex()
+        for idx, (shift, assignment) in enumerate(schedule):
+            day, start, end = shift_interval(shift)
+            duration = calculate_shift_duration(shift)
+            for workers in assignment.values():
+                for w in workers:
+                    if w.name in employee_assigned_hours:
+                        employee_assigned_hours[w.name] += duration
+                        employee_assigned_days[w.name].add(day)
+                    interval_index.add(w.name, day, start, end, idx)
         
         # 按稀缺度对班次进行排序
-        sorted_shifts = self._sort_shifts_by_scarcity(position_scarcity)
+        sorted_targets = sorted(targets, key=lambda idx: self._shift_scarcity_key(schedule[idx][0], position_scarcity))
         
-        for shift in sorted_shifts:
-            assignment = {}
+        for shift_idx in sorted_targets:
+            shift, assignment = schedule[shift_idx]
+            positions = targets[shift_idx]
+            day, start, end = shift_interval(shift)
+            duration = calculate_shift_duration(shift)
             
             # 按稀缺度对职位进行排序
             sorted_positions = self._sort_positions_by_scarcity(shift.required_positions.items(), position_scarcity)
             
             for position, count in sorted_positions:
-                # 获取并评分候选员工
-                candidates = self.employee_store_position_map.get((shift.store, position), [])
+                if positions is not None and position not in positions:
+                    continue
+                existing = assignment.get(position, [])
+                
+                # 获取并评分候选员工（排除当天时间重叠的员工）
+                candidates = [
+                    e
+                    for e in self.employee_store_position_map.get((shift.store, position), [])
+                    if not interval_index.has_conflict(e.name, day, start, end)
+                ]
+                if shuffle:
+                    random.shuffle(candidates)
                 scored_candidates = self._score_candidates(
                     candidates, shift, employee_assigned_hours, employee_assigned_days
                 )
                 
                 # 选择评分最高的员工
-                selected = [scored_candidates[i][0] for i in range(min(count, len(scored_candidates)))]
+                needed = max(0, count - len(existing))
+                selected = [scored_candidates[i][0] for i in range(min(needed, len(scored_candidates)))]
                 
                 # 更新员工工时和工作日记录
                 for employee in selected:
-                    duration = calculate_shift_duration(shift)
                     employee_assigned_hours[employee.name] += duration
                     employee_assigned_days[employee.name].add(shift.day)
+                    interval_index.add(employee.name, day, start, end, shift_idx)
                 
-                assignment[position] = selected
+                assignment[position] = existing + selected
                 logger.debug(
                     f"班次{shift.day} {shift.start_time}-{shift.end_time} - 门店{shift.store} - 分配{position} {len(selected)}人"
                 )
-            
-            schedule.append((shift, assignment))
+    
+    def generate_initial_solution(self) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+        """生成初始解"""
+        logger.info("开始生成初始解...")
+        
+        # 按稀缺度对班次进行排序，再逐个班次贪心分配
+        sorted_shifts = self._sort_shifts_by_scarcity(self._get_position_scarcity())
+        schedule = [(shift, {}) for shift in sorted_shifts]
+        self._greedy_fill(schedule, {idx: None for idx in range(len(schedule))})
         
         logger.info(f"初始解生成完成，共安排{len(self.shifts)}个班次")
         return schedule
@@ -337,6 +688,18 @@ class SchedulingAlgorithm:
                 
         return cost
     
+    def _check_shift_overlaps(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]],
+                              violation_details: List[str]) -> float:
+        """检查同一员工是否被安排到当天重叠的班次"""
+        cost = 0
+        for name, idx, overlapping in find_double_bookings(schedule):
+            shift = schedule[idx][0]
+            violation_details.append(
+                f"{name} 周{shift.day+1} 班次{shift.start_time}-{shift.end_time} 与其他{len(overlapping)}个班次时间重叠"
+            )
+            cost += self.cost_params["double_booking"]
+        return cost
+    
     def _log_violations(self, violation_details: List[str]) -> None:
         """记录违规详情"""
         if violation_details:
@@ -367,28 +730,121 @@ class SchedulingAlgorithm:
         # 检查工时限制
         cost += self._check_hours_limits(employee_weekly_hours, employee_daily_hours, violation_details)
         
+        # 检查重叠班次
+        cost += self._check_shift_overlaps(schedule, violation_details)
+        
         # 记录详细违规信息
         self._log_violations(violation_details)
         
         logger.debug(f"总成本计算完成：{cost}")
         return cost
     
+    def _shift_indices(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[int]:
+        """求排班方案中每个班次在 self.shifts 中的下标（按字段匹配，完全相同的班次依次匹配）"""
+        by_key: Dict[Tuple, List[int]] = {}
+        for i, shift in enumerate(self.shifts):
+            key = (shift.day, shift.start_time, shift.end_time, shift.store, tuple(sorted(shift.required_positions.items())))
+            by_key.setdefault(key, []).append(i)
+        cursor = {key: 0 for key in by_key}
+        indices = []
+        for shift, _ in schedule:
+            key = (shift.day, shift.start_time, shift.end_time, shift.store, tuple(sorted(shift.required_positions.items())))
+            if key not in by_key or cursor[key] >= len(by_key[key]):
+                raise ValueError(f"排班方案中的班次不在班次列表中: 周{shift.day+1} {shift.start_time}-{shift.end_time} {shift.store}")
+            indices.append(by_key[key][cursor[key]])
+            cursor[key] += 1
+        return indices
+    
+    def encode_schedule(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Tuple[int, int, int]]:
+        """将排班方案编码为 (班次下标, 职位下标, 员工下标) 列表"""
+        assignments = []
+        for shift_idx, (_, assignment) in zip(self._shift_indices(schedule), schedule):
+            for position, workers in assignment.items():
+                for w in workers:
+                    assignments.append((shift_idx, self.position_index[position], self.employee_index[w.name]))
+        return assignments
+    
+    def decode_schedule(self, assignments: List[Tuple[int, int, int]]) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+        """将紧凑编码还原为排班方案（班次按 self.shifts 顺序排列）"""
+        schedule = [(shift, {position: [] for position in shift.required_positions}) for shift in self.shifts]
+        for shift_idx, position_idx, employee_idx in assignments:
+            position = self.positions[position_idx]
+            schedule[shift_idx][1].setdefault(position, []).append(self.employees[employee_idx])
+        return schedule
+    
+    def snapshot_schedule(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[List[Any]]:
+        """将排班方案编码为可 JSON 序列化的快照，完整保留班次顺序和职位顺序
+        
+        格式: [[班次下标, [[职位, [员工下标, ...]], ...]], ...]
+        """
+        return [
+            [shift_idx, [[position, [self.employee_index[w.name] for w in workers]]
+                         for position, workers in assignment.items()]]
+            for shift_idx, (_, assignment) in zip(self._shift_indices(schedule), schedule)
+        ]
+    
+    def restore_schedule(self, snapshot: List[List[Any]]) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+        """由 snapshot_schedule 生成的快照还原排班方案"""
+        return [
+            (self.shifts[shift_idx], {position: [self.employees[i] for i in workers] for position, workers in positions})
+            for shift_idx, positions in snapshot
+        ]
+    
+    def _get_interval_index(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> EmployeeDayIntervalIndex:
+        """获取排班方案对应的区间索引
+
+        若 schedule 是上一次生成的相邻解，则在父方案索引上增量应用变更，否则重建。
+        """
+        if self._interval_index_owner is schedule:
+            return self._interval_index
+        
+        pending = self._pending_index_changes
+        if pending is not None and pending[0] is self._interval_index_owner and pending[1] is schedule:
+            for action, name, day, start, end, shift_idx in pending[2]:
+                if action == "remove":
+                    self._interval_index.remove(name, day, shift_idx)
+                else:
+                    self._interval_index.add(name, day, start, end, shift_idx)
+        else:
+            self._interval_index = EmployeeDayIntervalIndex.from_schedule(schedule)
+        
+        self._interval_index_owner = schedule
+        self._pending_index_changes = None
+        return self._interval_index
+    
+    def _record_index_changes(self, parent: List[Tuple[Shift, Dict[str, List[Employee]]]],
+                              child: List[Tuple[Shift, Dict[str, List[Employee]]]],
+                              changes: List[Tuple[str, str, int, int, int, int]]) -> None:
+        """记录相邻解相对父方案的区间变更，供后续增量更新索引"""
+        self._last_neighbor_changes = changes
+        if self._interval_index_owner is parent:
+            self._pending_index_changes = (parent, child, changes)
+        else:
+            self._pending_index_changes = None
+    
     def generate_neighbor_replace(self, current_schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
         """原有的替换员工操作，作为基础邻域操作"""
+        interval_index = self._get_interval_index(current_schedule)
         new_schedule = copy.deepcopy(current_schedule)
+        changes = []
         
         idx = random.randint(0, len(new_schedule) - 1)
         shift, assignment = new_schedule[idx]
+        day, start, end = shift_interval(shift)
         
         positions = list(shift.required_positions.keys())
         if not positions:
+            self._record_index_changes(current_schedule, new_schedule, changes)
             return new_schedule
         selected_pos = random.choice(positions)
         
-        current_workers = assignment.get(selected_pos, [])
+        if selected_pos not in assignment:
+            assignment[selected_pos] = []
+        current_workers = assignment[selected_pos]
         if current_workers:
             remove_idx = random.randint(0, len(current_workers) - 1)
             removed = current_workers.pop(remove_idx)
+            changes.append(("remove", removed.name, day, start, end, idx))
             logger.debug(f"移除员工：{removed.name}（{selected_pos}）")
         
         # 获取当前班次中所有已分配的员工（跨职位）
@@ -396,135 +852,236 @@ class SchedulingAlgorithm:
         for pos, workers in assignment.items():
             already_assigned.extend([w.name for w in workers])
         
-        # 使用预处理的数据结构获取候选员工
+        # 使用预处理的数据结构获取候选员工，并排除当天时间重叠的员工
         candidates = [
             e
             for e in self.employee_store_position_map.get((shift.store, selected_pos), [])
             if e.name not in already_assigned
+            and not interval_index.has_conflict(e.name, day, start, end, ignore=idx)
         ]
         
         if candidates:
             new_worker = random.choice(candidates)
             current_workers.append(new_worker)
+            changes.append(("add", new_worker.name, day, start, end, idx))
             logger.debug(f"新增员工：{new_worker.name}（{selected_pos}）- 门店：{shift.store}")
         else:
             logger.debug(f"没有可用的未分配员工，跳过添加")
-            
+        
+        self._record_index_changes(current_schedule, new_schedule, changes)
         return new_schedule
     
     def generate_neighbor(self, current_schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
         """生成相邻解"""
         logger.debug("生成相邻解...")
-        new_schedule = copy.deepcopy(current_schedule)
         
         # 随机选择邻域操作类型
         operation_type = random.choice(["swap", "replace", "move"])
         logger.debug(f"选择邻域操作: {operation_type}")
         
+        if operation_type == "replace" or len(current_schedule) < 2:
+            # 操作3: 替换员工（原有的操作）；只有一个班次时也退化为替换操作
+            return self.generate_neighbor_replace(current_schedule)
+        
+        interval_index = self._get_interval_index(current_schedule)
+        
+        # 随机选择两个不同的班次
+        idx1, idx2 = random.sample(range(len(current_schedule)), 2)
+        shift1, assignment1 = current_schedule[idx1]
+        shift2, assignment2 = current_schedule[idx2]
+        day1, start1, end1 = shift_interval(shift1)
+        day2, start2, end2 = shift_interval(shift2)
+        
         if operation_type == "swap":
             # 操作1: 交换两个班次中的员工
-            if len(new_schedule) < 2:
-                return self.generate_neighbor_replace(new_schedule)  # 如果只有一个班次，退化为替换操作
-                
-            # 随机选择两个不同的班次
-            idx1, idx2 = random.sample(range(len(new_schedule)), 2)
-            shift1, assignment1 = new_schedule[idx1]
-            shift2, assignment2 = new_schedule[idx2]
-            
             # 尝试找到可以交换的员工
-            common_positions = set(assignment1.keys()) & set(assignment2.keys())
+            # 按字典顺序取共同职位，保证相同随机状态下轨迹可复现
+            common_positions = [p for p in assignment1 if p in assignment2]
             if not common_positions:
-                return self.generate_neighbor_replace(new_schedule)  # 没有共同职位，退化为替换操作
+                return self.generate_neighbor_replace(current_schedule)  # 没有共同职位，退化为替换操作
                 
-            selected_pos = random.choice(list(common_positions))
+            selected_pos = random.choice(common_positions)
             
             workers1 = assignment1.get(selected_pos, [])
             workers2 = assignment2.get(selected_pos, [])
             
             if not workers1 or not workers2:
-                return self.generate_neighbor_replace(new_schedule)  # 任一班次没有该职位的员工，退化为替换操作
+                return self.generate_neighbor_replace(current_schedule)  # 任一班次没有该职位的员工，退化为替换操作
                 
             # 随机选择要交换的员工
-            worker1 = random.choice(workers1)
-            worker2 = random.choice(workers2)
-            
-            # 检查门店匹配
-            if worker1.store == shift2.store and worker2.store == shift1.store:
-                # 执行交换
-                workers1.remove(worker1)
-                workers2.remove(worker2)
-                workers1.append(worker2)
-                workers2.append(worker1)
-                logger.debug(f"交换员工: {worker1.name} 和 {worker2.name}")
-            else:
-                return self.generate_neighbor_replace(new_schedule)  # 门店不匹配，退化为替换操作
-                
-        elif operation_type == "move":
-            # 操作2: 将员工从一个班次移动到另一个班次
-            if len(new_schedule) < 2:
-                return self.generate_neighbor_replace(new_schedule)  # 如果只有一个班次，退化为替换操作
-                
-            # 随机选择两个不同的班次
-            idx1, idx2 = random.sample(range(len(new_schedule)), 2)
-            shift1, assignment1 = new_schedule[idx1]
-            shift2, assignment2 = new_schedule[idx2]
+            pos1 = random.randrange(len(workers1))
+            pos2 = random.randrange(len(workers2))
+            worker1 = workers1[pos1]
+            worker2 = workers2[pos2]
+            
+            # 检查门店匹配，且交换后不会与当天其他班次重叠
+            if not (worker1.store == shift2.store and worker2.store == shift1.store):
+                return self.generate_neighbor_replace(current_schedule)  # 门店不匹配，退化为替换操作
+            if (interval_index.has_conflict(worker1.name, day2, start2, end2, ignore=idx1) or
+                    interval_index.has_conflict(worker2.name, day1, start1, end1, ignore=idx2)):
+                return self.generate_neighbor_replace(current_schedule)  # 时间重叠，退化为替换操作
             
+            # 执行交换
+            new_schedule = copy.deepcopy(current_schedule)
+            new_workers1 = new_schedule[idx1][1][selected_pos]
+            new_workers2 = new_schedule[idx2][1][selected_pos]
+            new_worker1 = new_workers1.pop(pos1)
+            new_worker2 = new_workers2.pop(pos2)
+            new_workers1.append(new_worker2)
+            new_workers2.append(new_worker1)
+            self._record_index_changes(current_schedule, new_schedule, [
+                ("remove", worker1.name, day1, start1, end1, idx1),
+                ("remove", worker2.name, day2, start2, end2, idx2),
+                ("add", worker2.name, day1, start1, end1, idx1),
+                ("add", worker1.name, day2, start2, end2, idx2),
+            ])
+            logger.debug(f"交换员工: {worker1.name} 和 {worker2.name}")
+        else:
+            # 操作2: 将员工从一个班次移动到另一个班次
             # 随机选择一个职位
             if not assignment1:
-                return self.generate_neighbor_replace(new_schedule)
+                return self.generate_neighbor_replace(current_schedule)
                 
             selected_pos = random.choice(list(assignment1.keys()))
             workers1 = assignment1.get(selected_pos, [])
             
             if not workers1:
-                return self.generate_neighbor_replace(new_schedule)
+                return self.generate_neighbor_replace(current_schedule)
                 
             # 随机选择要移动的员工
-            worker = random.choice(workers1)
+            pos1 = random.randrange(len(workers1))
+            worker = workers1[pos1]
             
-            # 检查目标班次是否需要该职位且员工门店匹配
-            if (selected_pos in shift2.required_positions and 
-                worker.store == shift2.store and
-                worker.name not in [w.name for w in assignment2.get(selected_pos, [])]):
-                
-                # 执行移动
-                workers1.remove(worker)
-                if selected_pos not in assignment2:
-                    assignment2[selected_pos] = []
-                assignment2[selected_pos].append(worker)
-                logger.debug(f"移动员工: {worker.name} 从班次{shift1.day} 到班次{shift2.day}")
-            else:
-                return self.generate_neighbor_replace(new_schedule)  # 条件不满足，退化为替换操作
-        else:
-            # 操作3: 替换员工（原有的操作）
-            return self.generate_neighbor_replace(new_schedule)
+            # 检查目标班次是否需要该职位、员工门店匹配，且不会与当天其他班次重叠
+            # （区间索引同时覆盖了员工已在目标班次的情况）
+            if not (selected_pos in shift2.required_positions and 
+                    worker.store == shift2.store and
+                    not interval_index.has_conflict(worker.name, day2, start2, end2, ignore=idx1)):
+                return self.generate_neighbor_replace(current_schedule)  # 条件不满足，退化为替换操作
+            
+            # 执行移动
+            new_schedule = copy.deepcopy(current_schedule)
+            new_worker = new_schedule[idx1][1][selected_pos].pop(pos1)
+            new_schedule[idx2][1].setdefault(selected_pos, []).append(new_worker)
+            self._record_index_changes(current_schedule, new_schedule, [
+                ("remove", worker.name, day1, start1, end1, idx1),
+                ("add", worker.name, day2, start2, end2, idx2),
+            ])
+            logger.debug(f"移动员工: {worker.name} 从班次{shift1.day} 到班次{shift2.day}")
             
         return new_schedule
     
-    def simulated_annealing(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
-        """使用模拟退火算法生成排班表"""
-        # 初始化收敛数据记录
-        convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+    def _checkpoint_path(self) -> str:
+        """检查点文件路径
         
-        # 初始化随机排班
-        current_schedule = self.generate_initial_solution()
-        current_cost = self.calculate_cost(current_schedule)
-        
-        # 记录最佳解
-        best_schedule = copy.deepcopy(current_schedule)
-        best_cost = current_cost
+        文件名包含问题指纹和 checkpoint_tag，不同问题或同一问题的并行求解各自使用独立文件。
+        """
+        stem, ext = os.path.splitext(self.sa_config["checkpoint_file"])
+        tag = self.sa_config["checkpoint_tag"]
+        suffix = f"-{tag}" if tag != "" else ""
+        return os.path.join(DATA_DIR, f"{stem}-{self._problem_fingerprint()[:16]}{suffix}{ext}")
+    
+    def _problem_fingerprint(self) -> str:
+        """问题数据与参数的指纹，用于确认检查点属于同一问题"""
+        if self._fingerprint is not None:
+            return self._fingerprint
+        ignored = set(CHECKPOINT_CONFIG)
+        payload = {
+            "employees": [asdict(e) for e in self.employees],
+            "shifts": [asdict(s) for s in self.shifts],
+            "sa_config": {k: v for k, v in self.sa_config.items() if k not in ignored},
+            "cost_params": self.cost_params,
+        }
+        canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        self._fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return self._fingerprint
+    
+    def _save_checkpoint(self, state: Dict[str, Any]) -> None:
+        """原子地写入检查点：先写临时文件并刷盘，再替换正式文件"""
+        path = self._checkpoint_path()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.debug(f"检查点已写入: {path}")
+    
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """读取检查点并校验其属于当前问题；文件不存在或不匹配时返回 None"""
+        path = self._checkpoint_path()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get("fingerprint") != self._problem_fingerprint():
+            logger.warning(f"检查点与当前排班问题不匹配，忽略并重新开始: {path}")
+            return None
+        return state
+    
+    def _remove_checkpoint(self) -> None:
+        """删除检查点文件，文件已不存在时忽略"""
+        try:
+            os.remove(self._checkpoint_path())
+        except FileNotFoundError:
+            pass
+    
+    def simulated_annealing(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+        """使用模拟退火算法生成排班表
         
-        # 初始化温度和迭代计数
-        temperature = self.sa_config["initial_temp"]
-        iteration = 0
+        checkpoint_interval > 0 时每隔若干温度步把完整状态（当前解、最优解、温度、迭代数、
+        随机数状态和收敛数据）写入 DATA_DIR 下的检查点文件；resume 为 True 时从检查点继续，
+        轨迹与未中断时一致。正常结束后删除检查点。
+        """
+        checkpoint_interval = self.sa_config["checkpoint_interval"]
         
-        # 记录初始状态
-        convergence_data["temperatures"].append(temperature)
-        convergence_data["current_costs"].append(current_cost)
-        convergence_data["best_costs"].append(best_cost)
+        state = self._load_checkpoint() if self.sa_config["resume"] else None
+        resumed = state is not None
+        if resumed:
+            # 从检查点恢复
+            current_schedule = self.restore_schedule(state["current_schedule"])
+            current_cost = state["current_cost"]
+            best_schedule = self.restore_schedule(state["best_schedule"])
+            best_cost = state["best_cost"]
+            temperature = state["temperature"]
+            iteration = state["iteration"]
+            temp_step = state["temp_step"]
+            convergence_data = state["convergence_data"]
+            version, internal_state, gauss_next = state["rng_state"]
+            random.setstate((version, tuple(internal_state), gauss_next))
+            logger.info(f"从检查点恢复：第{iteration}次迭代，温度{temperature:.4f}")
+        else:
+            # 初始化收敛数据记录
+            convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+            
+            # 初始化随机排班
+            current_schedule = self.generate_initial_solution()
+            current_cost = self.calculate_cost(current_schedule)
+            
+            # 记录最佳解
+            best_schedule = copy.deepcopy(current_schedule)
+            best_cost = current_cost
+            
+            # 初始化温度和迭代计数
+            temperature = self.sa_config["initial_temp"]
+            iteration = 0
+            temp_step = 0
+            
+            # 记录初始状态
+            convergence_data["temperatures"].append(temperature)
+            convergence_data["current_costs"].append(current_cost)
+            convergence_data["best_costs"].append(best_cost)
         
         # 模拟退火主循环
-        while temperature > self.sa_config["min_temp"]:
+        reached_gap = self._reached_optimality_gap(best_cost)
+        while temperature > self.sa_config["min_temp"] and not reached_gap:
+            self._check_cancelled()
             for _ in range(self.sa_config["iter_per_temp"]):
                 # 生成邻域解
                 new_schedule = self.generate_neighbor(current_schedule)
@@ -542,8 +1099,12 @@ class SchedulingAlgorithm:
                     if current_cost < best_cost:
                         best_schedule = copy.deepcopy(current_schedule)
                         best_cost = current_cost
+                        reached_gap = self._reached_optimality_gap(best_cost)
                 
                 iteration += 1
+                if reached_gap:
+                    logger.info(f"最优解已达到下界差距要求，提前结束（第{iteration}次迭代）")
+                    break
             
             # 记录当前状态
             convergence_data["temperatures"].append(temperature)
@@ -552,34 +1113,610 @@ class SchedulingAlgorithm:
             
             # 降温
             temperature *= self.sa_config["cooling_rate"]
+            temp_step += 1
+            
+            # 在温度步边界写检查点，不影响内层循环
+            if checkpoint_interval > 0 and temp_step % checkpoint_interval == 0 and not reached_gap:
+                self._save_checkpoint({
+                    "fingerprint": self._problem_fingerprint(),
+                    "current_schedule": self.snapshot_schedule(current_schedule),
+                    "current_cost": current_cost,
+                    "best_schedule": self.snapshot_schedule(best_schedule),
+                    "best_cost": best_cost,
+                    "temperature": temperature,
+                    "iteration": iteration,
+                    "temp_step": temp_step,
+                    "rng_state": random.getstate(),
+                    "convergence_data": convergence_data,
+                })
+        
+        # 写过或载入过检查点时都要删除，避免之后的 resume 重放已完成的求解
+        if checkpoint_interval > 0 or resumed:
+            self._remove_checkpoint()
         
         logger.info(f"模拟退火完成，最终成本: {best_cost:.2f}")
         
         # 返回最佳排班表和成本，以及收敛数据
         return best_schedule, best_cost, convergence_data
-
-
-def format_schedule_output(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Dict[str, Any]]:
-    """格式化排班结果为易读格式"""
-    formatted_schedule = []
-    for shift, assignment in schedule:
-        shift_data = {
-            "day": shift.day,
-            "start_time": shift.start_time,
-            "end_time": shift.end_time,
-            "store": shift.store,
-            "assignments": {}
+    
+    def tabu_search(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+        """使用禁忌搜索生成排班表
+        
+        每步从当前解采样一批相邻解，选择未被禁忌的最优解（即使比当前解差）。
+        刚被改动过的 (员工, 班次) 对在 tabu_tenure 步内禁止再次改动，
+        除非改动后的成本优于历史最优（特赦准则）。
+        """
+        # 初始化收敛数据记录（禁忌搜索没有温度，温度一栏记为0以保持结构一致）
+        convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+        
+        current_schedule = self.generate_initial_solution()
+        current_cost = self.calculate_cost(current_schedule)
+        
+        best_schedule = copy.deepcopy(current_schedule)
+        best_cost = current_cost
+        
+        convergence_data["temperatures"].append(0.0)
+        convergence_data["current_costs"].append(current_cost)
+        convergence_data["best_costs"].append(best_cost)
+        
+        # (员工名, 班次下标) -> 禁忌解除的步数
+        tabu_until: Dict[Tuple[str, int], int] = {}
+        no_improve = 0
+        
+        # 初始解已达到下界差距要求（例如没有班次）时不再搜索
+        iterations = 0 if self._reached_optimality_gap(best_cost) else self.sa_config["tabu_iterations"]
+        for step in range(iterations):
+            self._check_cancelled()
+            chosen = None
+            for _ in range(self.sa_config["tabu_neighborhood_size"]):
+                new_schedule = self.generate_neighbor(current_schedule)
+                changes = self._last_neighbor_changes
+                if not changes:
+                    continue
+                new_cost = self.calculate_cost(new_schedule)
+                
+                # 禁忌判断与特赦准则
+                is_tabu = any(tabu_until.get((name, idx), -1) > step for _, name, _, _, _, idx in changes)
+                if is_tabu and new_cost >= best_cost:
+                    continue
+                
+                if chosen is None or new_cost < chosen[1]:
+                    chosen = (new_schedule, new_cost, changes)
+            
+            if chosen is None:
+                logger.debug(f"禁忌搜索第{step}步没有可行的相邻解")
+                no_improve += 1
+            else:
+                new_schedule, new_cost, changes = chosen
+                # 让区间索引沿被选中的相邻解增量更新
+                self._record_index_changes(current_schedule, new_schedule, changes)
+                current_schedule = new_schedule
+                current_cost = new_cost
+                for _, name, _, _, _, idx in changes:
+                    tabu_until[(name, idx)] = step + 1 + self.sa_config["tabu_tenure"]
+                
+                if current_cost < best_cost:
+                    best_schedule = copy.deepcopy(current_schedule)
+                    best_cost = current_cost
+                    no_improve = 0
+                else:
+                    no_improve += 1
+            
+            convergence_data["temperatures"].append(0.0)
+            convergence_data["current_costs"].append(current_cost)
+            convergence_data["best_costs"].append(best_cost)
+            
+            if self._reached_optimality_gap(best_cost):
+                logger.info(f"最优解已达到下界差距要求，提前结束（第{step + 1}步）")
+                break
+            if no_improve >= self.sa_config["tabu_max_no_improve"]:
+                break
+        
+        logger.info(f"禁忌搜索完成，最终成本: {best_cost:.2f}")
+        
+        return best_schedule, best_cost, convergence_data
+    
+    def _destroy(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> Dict[int, Optional[Set[str]]]:
+        """随机选择一种破坏方式，清空 schedule 中对应的分配（原地修改）
+        
+        破坏方式：
+            day: 某一天的全部班次
+            block: 某门店某职位在整周的全部分配
+            random: 随机若干班次
+        
+        Returns:
+            被破坏的班次下标 -> 被清空的职位集合（None 表示全部职位）
+        """
+        mode = random.choice(["day", "block", "random"])
+        destroyed: Dict[int, Optional[Set[str]]] = {}
+        
+        if mode == "day":
+            day = random.choice([shift.day for shift, _ in schedule])
+            for idx, (shift, _) in enumerate(schedule):
+                if shift.day == day:
+                    destroyed[idx] = None
+        elif mode == "block":
+            blocks = [(shift.store, p) for shift, _ in schedule for p in shift.required_positions]
+            if blocks:
+                store, position = random.choice(blocks)
+                for idx, (shift, _) in enumerate(schedule):
+                    if shift.store == store and position in shift.required_positions:
+                        destroyed[idx] = {position}
+        else:
+            k = max(1, int(len(schedule) * self.sa_config["lns_destroy_fraction"]))
+            for idx in random.sample(range(len(schedule)), min(k, len(schedule))):
+                destroyed[idx] = None
+        
+        for idx, positions in destroyed.items():
+            assignment = schedule[idx][1]
+            for position in list(assignment.keys()):
+                if positions is None or position in positions:
+                    assignment[position] = []
+        
+        logger.debug(f"破坏方式: {mode}，破坏{len(destroyed)}个班次")
+        return destroyed
+    
+    def large_neighborhood_search(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+        """使用大邻域搜索（破坏-重建）生成排班表
+        
+        每次破坏一天、一个门店-职位块或随机若干班次的分配，
+        再用与初始解相同的稀缺度贪心逻辑重建，按模拟退火准则决定是否接受。
+        """
+        convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+        
+        current_schedule = self.generate_initial_solution()
+        current_cost = self.calculate_cost(current_schedule)
+        
+        best_schedule = copy.deepcopy(current_schedule)
+        best_cost = current_cost
+        
+        temperature = self.sa_config["initial_temp"]
+        iteration = 0
+        
+        convergence_data["temperatures"].append(temperature)
+        convergence_data["current_costs"].append(current_cost)
+        convergence_data["best_costs"].append(best_cost)
+        
+        reached_gap = self._reached_optimality_gap(best_cost)
+        while temperature > self.sa_config["min_temp"] and not reached_gap:
+            self._check_cancelled()
+            for _ in range(self.sa_config["lns_iter_per_temp"]):
+                # 破坏并重建
+                new_schedule = copy.deepcopy(current_schedule)
+                destroyed = self._destroy(new_schedule)
+                self._greedy_fill(new_schedule, destroyed, shuffle=True)
+                new_cost = self.calculate_cost(new_schedule)
+                
+                # 接受准则
+                cost_diff = new_cost - current_cost
+                if cost_diff < 0 or random.random() < math.exp(-cost_diff / temperature):
+                    current_schedule = new_schedule
+                    current_cost = new_cost
+                    
+                    if current_cost < best_cost:
+                        best_schedule = copy.deepcopy(current_schedule)
+                        best_cost = current_cost
+                        reached_gap = self._reached_optimality_gap(best_cost)
+                
+                iteration += 1
+                if reached_gap:
+                    logger.info(f"最优解已达到下界差距要求，提前结束（第{iteration}次迭代）")
+                    break
+            
+            convergence_data["temperatures"].append(temperature)
+            convergence_data["current_costs"].append(current_cost)
+            convergence_data["best_costs"].append(best_cost)
+            
+            temperature *= self.sa_config["cooling_rate"]
+        
+        logger.info(f"大邻域搜索完成，最终成本: {best_cost:.2f}")
+        
+        return best_schedule, best_cost, convergence_data
+    
+    def build_equivalence_classes(self) -> List[List[Employee]]:
+        """将可互换的员工分组为等价类
+        
+        门店、职位、工作日偏好、时间偏好和工时上限都相同的员工视为等价；
+        各类按首个成员在员工列表中的顺序排列。
+        """
+        classes: Dict[Tuple, List[Employee]] = {}
+        for e in self.employees:
+            key = (e.store, e.position, tuple(e.workday_pref), tuple(e.time_pref), e.max_daily_hours, e.max_weekly_hours)
+            classes.setdefault(key, []).append(e)
+        return list(classes.values())
+    
+    def _concretize_class_counts(self, state: List[Tuple[Shift, Dict[str, List[int]]]],
+                                 classes: List[List[Employee]]) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+        """把按等价类计数的方案落实到具体员工
+        
+        按日期和开始时间顺序处理班次，每个类需要的人数从该类成员中挑选：
+        优先当天时间不重叠的成员，其次当天工时少、本周工时少的成员，使类内工时均衡。
+        """
+        schedule = [(shift, {position: [] for position in units}) for shift, units in state]
+        weekly = {e.name: 0.0 for e in self.employees}
+        daily = {e.name: [0.0] * 7 for e in self.employees}
+        interval_index = EmployeeDayIntervalIndex()
+        
+        order = sorted(range(len(state)), key=lambda i: (state[i][0].day, time_to_minutes(state[i][0].start_time)))
+        for idx in order:
+            shift, units = state[idx]
+            day, start, end = shift_interval(shift)
+            duration = calculate_shift_duration(shift)
+            in_shift: Set[str] = set()
+            for position, class_units in units.items():
+                for class_idx in class_units:
+                    members = [e for e in classes[class_idx] if e.name not in in_shift]
+                    if not members:
+                        continue
+                    chosen = min(members, key=lambda e: (
+                        interval_index.has_conflict(e.name, day, start, end), daily[e.name][day], weekly[e.name]
+                    ))
+                    schedule[idx][1][position].append(chosen)
+                    in_shift.add(chosen.name)
+                    weekly[chosen.name] += duration
+                    daily[chosen.name][day] += duration
+                    interval_index.add(chosen.name, day, start, end, idx)
+        return schedule
+    
+    def _class_count_neighbor(self, state: List[Tuple[Shift, Dict[str, List[int]]]],
+                              classes: List[List[Employee]],
+                              class_map: Dict[Tuple[str, str], List[int]]) -> Optional[List[Tuple[Shift, Dict[str, List[int]]]]]:
+        """在等价类计数上生成相邻解；同类成员不可区分，因此不会产生同类互换这类空操作
+        
+        操作：增加一个类的人数、把一个类的名额换成另一个类、减少一个类的人数、
+        把一个类的名额移到同门店同职位的另一个班次。返回 None 表示本次没有可行操作。
+        """
+        new_state = [(shift, {position: list(units) for position, units in assignment.items()})
+                     for shift, assignment in state]
+        idx = random.randrange(len(new_state))
+        shift, assignment = new_state[idx]
+        if not shift.required_positions:
+            return None
+        position = random.choice(list(shift.required_positions.keys()))
+        units = assignment.setdefault(position, [])
+        eligible = class_map.get((shift.store, position), [])
+        # 该班次中尚有空余成员的类（同一员工在一个班次中只能出现一次）
+        spare = [k for k in eligible if units.count(k) < len(classes[k])]
+        
+        operation = random.choice(["add", "replace", "remove", "move"])
+        if operation == "add" or (not units and operation != "move"):
+            if len(units) >= shift.required_positions[position] or not spare:
+                return None
+            units.append(random.choice(spare))
+        elif operation == "replace":
+            old = random.choice(units)
+            candidates = [k for k in spare if k != old]
+            if not candidates:
+                return None
+            units.remove(old)
+            units.append(random.choice(candidates))
+        elif operation == "remove":
+            units.remove(random.choice(units))
+        else:
+            if not units:
+                return None
+            target = random.randrange(len(new_state))
+            target_shift, target_assignment = new_state[target]
+            if target == idx or target_shift.store != shift.store or position not in target_shift.required_positions:
+                return None
+            class_idx = random.choice(units)
+            target_units = target_assignment.setdefault(position, [])
+            if target_units.count(class_idx) >= len(classes[class_idx]):
+                return None
+            units.remove(class_idx)
+            target_units.append(class_idx)
+        units.sort()
+        return new_state
+    
+    def class_count_annealing(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+        """在员工等价类约简后的空间上做模拟退火
+        
+        方案只记录每个班次-职位中各等价类的人数，邻域大小取决于类的数量而不是员工数量；
+        评估时按类内工时均衡的规则落实到具体员工，再用 calculate_cost 计算成本。
+        """
+        classes = self.build_equivalence_classes()
+        class_of = {e.name: k for k, members in enumerate(classes) for e in members}
+        class_map: Dict[Tuple[str, str], List[int]] = {}
+        for k, members in enumerate(classes):
+            class_map.setdefault((members[0].store, members[0].position), []).append(k)
+        logger.info(f"等价类约简：{len(self.employees)}名员工归为{len(classes)}个等价类")
+        
+        convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+        
+        # 由初始解得到各班次-职位的类计数
+        initial = self.generate_initial_solution()
+        current_state = [
+            (shift, {position: sorted(class_of[w.name] for w in workers) for position, workers in assignment.items()})
+            for shift, assignment in initial
+        ]
+        current_cost = self.calculate_cost(self._concretize_class_counts(current_state, classes))
+        best_state = current_state
+        best_cost = current_cost
+        
+        temperature = self.sa_config["initial_temp"]
+        iteration = 0
+        
+        convergence_data["temperatures"].append(temperature)
+        convergence_data["current_costs"].append(current_cost)
+        convergence_data["best_costs"].append(best_cost)
+        
+        reached_gap = self._reached_optimality_gap(best_cost)
+        while temperature > self.sa_config["min_temp"] and not reached_gap:
+            self._check_cancelled()
+            for _ in range(self.sa_config["iter_per_temp"]):
+                iteration += 1
+                new_state = self._class_count_neighbor(current_state, classes, class_map)
+                if new_state is None:
+                    continue
+                new_cost = self.calculate_cost(self._concretize_class_counts(new_state, classes))
+                
+                # 接受准则
+                cost_diff = new_cost - current_cost
+                if cost_diff < 0 or random.random() < math.exp(-cost_diff / temperature):
+                    current_state = new_state
+                    current_cost = new_cost
+                    
+                    if current_cost < best_cost:
+                        best_state = current_state
+                        best_cost = current_cost
+                        reached_gap = self._reached_optimality_gap(best_cost)
+                
+                if reached_gap:
+                    logger.info(f"最优解已达到下界差距要求，提前结束（第{iteration}次迭代）")
+                    break
+            
+            convergence_data["temperatures"].append(temperature)
+            convergence_data["current_costs"].append(current_cost)
+            convergence_data["best_costs"].append(best_cost)
+            
+            temperature *= self.sa_config["cooling_rate"]
+        
+        logger.info(f"模拟退火完成，最终成本: {best_cost:.2f}")
+        
+        return self._concretize_class_counts(best_state, classes), best_cost, convergence_data
+    
+    def solve(self) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+        """按配置中的 engine 选择搜索引擎求解
+        
+        只有普通模拟退火支持检查点；其他引擎与 checkpoint_interval 或 resume 同时使用时报错。
+        """
+        engines = {
+            "sa": self.simulated_annealing,
+            "tabu": self.tabu_search,
+            "lns": self.large_neighborhood_search,
         }
+        engine = self.sa_config["engine"]
+        if engine not in engines:
+            raise ValueError(f"未知的搜索引擎: {engine}")
         
-        for position, workers in assignment.items():
-            shift_data["assignments"][position] = [
-                {"name": w.name, "position": w.position, "store": w.store}
-                for w in workers
-            ]
+        uses_checkpoint = self.sa_config["checkpoint_interval"] > 0 or self.sa_config["resume"]
+        if engine == "sa" and self.sa_config["equivalence_reduction"]:
+            if uses_checkpoint:
+                raise ValueError("等价类约简（equivalence_reduction）不支持检查点，请关闭 checkpoint_interval 和 resume")
+            return self.class_count_annealing()
+        if engine != "sa" and uses_checkpoint:
+            raise ValueError(f"搜索引擎 {engine} 不支持检查点，请关闭 checkpoint_interval 和 resume")
+        return engines[engine]()
+    
+    def repair(self, schedule: List[Tuple[Shift, Dict[str, List[Employee]]]], affected_shifts: Set[int],
+               unavailable: Optional[Dict[str, Set[int]]] = None) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+        """局部修复排班方案
+        
+        只重新优化 affected_shifts（排班方案中的班次下标）中的分配，其余班次保持不变。
+        相关员工（受影响班次的已分配员工及候选员工）在其余班次上的工时与时间段视为固定，
+        据此计算局部成本：受影响班次的缺员与偏好成本，加上相关员工的工时超限成本。
+        先按评分贪心补齐，再在迭代次数和时间限制内做局部搜索。
+        
+        Args:
+            schedule: 原排班方案（不会被修改）
+            affected_shifts: 需要重新优化的班次下标
+            unavailable: 员工名 -> 不可上班的日期集合
+        """
+        start_clock = time.perf_counter()
+        unavailable = unavailable or {}
+        new_schedule = copy.deepcopy(schedule)
+        affected = sorted(affected_shifts)
+        if not affected:
+            return new_schedule
+        employee_by_name = {e.name: e for e in self.employees}
+        
+        # 相关员工：受影响班次的候选员工池
+        pools: Dict[int, Dict[str, List[Employee]]] = {}
+        connected: Set[str] = set()
+        for idx in affected:
+            shift, assignment = new_schedule[idx]
+            pools[idx] = {}
+            for position in shift.required_positions:
+                pool = [
+                    e for e in self.employee_store_position_map.get((shift.store, position), [])
+                    if shift.day not in unavailable.get(e.name, ())
+                ]
+                pools[idx][position] = pool
+                connected.update(e.name for e in pool)
+            # 移除已不在员工列表中、当天不可上班或已不需要该职位的员工
+            for position in list(assignment.keys()):
+                assignment[position] = [
+                    w for w in assignment[position]
+                    if w.name in employee_by_name
+                    and shift.day not in unavailable.get(w.name, ())
+                    and position in shift.required_positions
+                ]
+                if position not in shift.required_positions:
+                    del assignment[position]
+            connected.update(w.name for workers in assignment.values() for w in workers)
+        
+        # 相关员工在未受影响班次上的固定工时与时间段
+        affected_set = set(affected)
+        fixed_weekly = {name: 0.0 for name in connected}
+        fixed_daily = {name: [0.0] * 7 for name in connected}
+        fixed_index = EmployeeDayIntervalIndex()
+        for idx, (shift, assignment) in enumerate(new_schedule):
+            if idx in affected_set:
+                continue
+            day, start, end = shift_interval(shift)
+            duration = calculate_shift_duration(shift)
+            for workers in assignment.values():
+                for w in workers:
+                    if w.name in connected:
+                        fixed_weekly[w.name] += duration
+                        fixed_daily[w.name][day] += duration
+                        fixed_index.add(w.name, day, start, end, idx)
+        
+        intervals = {idx: shift_interval(new_schedule[idx][0]) for idx in affected}
+        durations = {idx: calculate_shift_duration(new_schedule[idx][0]) for idx in affected}
+        
+        def local_cost() -> float:
+            cost = 0
+            violation_details = []
+            weekly = dict(fixed_weekly)
+            daily = {name: list(hours) for name, hours in fixed_daily.items()}
+            for idx in affected:
+                shift, assignment = new_schedule[idx]
+                cost += self._check_shift_requirements(shift, assignment, violation_details)
+                for workers in assignment.values():
+                    for w in workers:
+                        cost += self._check_workday_preference(w, shift, violation_details)
+                        cost += self._check_time_preference(w, shift, violation_details)
+                        weekly[w.name] += durations[idx]
+                        daily[w.name][shift.day] += durations[idx]
+            for name in connected:
+                employee = employee_by_name.get(name)
+                if employee is None:
+                    continue
+                cost += self.cost_params["daily_hours_violation"] * sum(
+                    1 for hours in daily[name] if hours > employee.max_daily_hours
+                )
+                if weekly[name] > employee.max_weekly_hours:
+                    cost += self.cost_params["weekly_hours_violation"]
+            return cost
+        
+        def assigned_hours() -> Tuple[Dict[str, float], Dict[str, Set[int]]]:
+            hours = dict(fixed_weekly)
+            days = {name: {d for d in range(7) if fixed_daily[name][d] > 0} for name in connected}
+            for idx in affected:
+                shift, assignment = new_schedule[idx]
+                for workers in assignment.values():
+                    for w in workers:
+                        hours[w.name] += durations[idx]
+                        days[w.name].add(shift.day)
+            return hours, days
         
-        formatted_schedule.append(shift_data)
+        def can_take(name: str, idx: int) -> bool:
+            """员工能否加入受影响班次 idx（不在该班次中且时间不重叠）"""
+            day, start, end = intervals[idx]
+            if fixed_index.has_conflict(name, day, start, end):
+                return False
+            for other in affected:
+                other_day, other_start, other_end = intervals[other]
+                if other_day != day or other_start >= end or other_end <= start:
+                    continue
+                if any(w.name == name for workers in new_schedule[other][1].values() for w in workers):
+                    return False
+            return True
+        
+        # 贪心补齐：按评分为缺员的职位选择员工，多余的员工移除
+        for idx in affected:
+            shift, assignment = new_schedule[idx]
+            for position, count in shift.required_positions.items():
+                workers = assignment.setdefault(position, [])
+                del workers[count:]
+                if len(workers) >= count:
+                    continue
+                hours, days = assigned_hours()
+                candidates = [e for e in pools[idx][position] if can_take(e.name, idx)]
+                scored = self._score_candidates(candidates, shift, hours, days)
+                workers.extend(e for e, _ in scored[:count - len(workers)])
+        
+        # 局部搜索：在受影响班次内做替换/增加/移除，只接受严格改进的解，避免无收益的人员变动
+        current_cost = local_cost()
+        max_iterations = self.sa_config["repair_iterations"]
+        time_limit = self.sa_config["repair_time_limit"]
+        for iteration in range(max_iterations):
+            if current_cost <= 0 or time.perf_counter() - start_clock > time_limit:
+                break
+            idx = random.choice(affected)
+            shift, assignment = new_schedule[idx]
+            if not shift.required_positions:
+                continue
+            position = random.choice(list(shift.required_positions.keys()))
+            workers = assignment.setdefault(position, [])
+            candidates = [e for e in pools[idx][position] if can_take(e.name, idx)]
+            
+            removed = None
+            added = None
+            if len(workers) < shift.required_positions[position] and candidates:
+                added = random.choice(candidates)
+            elif workers and candidates and random.random() < 0.8:
+                removed = workers.pop(random.randrange(len(workers)))
+                added = random.choice(candidates)
+            elif workers:
+                removed = workers.pop(random.randrange(len(workers)))
+            else:
+                continue
+            if added is not None:
+                workers.append(added)
+            
+            new_cost = local_cost()
+            if new_cost < current_cost:
+                current_cost = new_cost
+            else:
+                # 撤销
+                if added is not None:
+                    workers.pop()
+                if removed is not None:
+                    workers.append(removed)
+        
+        logger.info(f"局部修复完成，重新优化{len(affected)}个班次，耗时{time.perf_counter() - start_clock:.3f}秒")
+        return new_schedule
+
+
+def schedule_assignments(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]]) -> List[Tuple[Any, Any, str]]:
+    """将排班方案展开为 (班次ID, 员工ID, 职位) 列表"""
+    return [
+        (shift.id, w.id, position)
+        for shift, assignment in schedule
+        for position, workers in assignment.items()
+        for w in workers
+    ]
+
+
+def diff_assignments(previous: List[Tuple[Any, Any, str]],
+                     current: List[Tuple[Any, Any, str]]) -> Dict[str, List[Tuple[Any, Any, str]]]:
+    """比较两组 (班次ID, 员工ID, 职位) 分配，返回新增和移除的分配"""
+    previous = [tuple(a) for a in previous]
+    current = [tuple(a) for a in current]
+    previous_set = set(previous)
+    current_set = set(current)
+    return {
+        "added": [a for a in current if a not in previous_set],
+        "removed": [a for a in previous if a not in current_set],
+    }
+
+
+def format_schedule_output(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]],
+                           employees: List[Employee],
+                           previous_assignments: Optional[List[Tuple[Any, Any, str]]] = None) -> Dict[str, Any]:
+    """格式化排班结果为紧凑格式
     
-    return formatted_schedule
+    员工和班次各输出一张表，分配以 [班次ID, 员工ID, 职位] 引用；
+    提供 previous_assignments 时附带与之相比的差异。
+    """
+    output = {
+        "employees": [
+            {"id": e.id, "name": e.name, "position": e.position, "store": e.store}
+            for e in employees
+        ],
+        "shifts": [
+            {"id": shift.id, "day": shift.day, "start_time": shift.start_time,
+             "end_time": shift.end_time, "store": shift.store}
+            for shift, _ in schedule
+        ],
+        "assignments": [list(a) for a in schedule_assignments(schedule)],
+    }
+    if previous_assignments is not None:
+        diff = diff_assignments(previous_assignments, schedule_assignments(schedule))
+        output["diff"] = {k: [list(a) for a in v] for k, v in diff.items()}
+    return output
 
 
 def analyze_violations(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]], employees: List[Employee]) -> Dict[str, int]:
@@ -589,7 +1726,8 @@ def analyze_violations(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]],
         "workday_pref": 0,
         "time_pref": 0,
         "daily_hours": 0,
-        "weekly_hours": 0
+        "weekly_hours": 0,
+        "double_booking": 0
     }
     
     # 初始化工时统计 - 修改为float类型
@@ -637,4 +1775,7 @@ def analyze_violations(schedule: List[Tuple[Shift, Dict[str, List[Employee]]]],
         if hours > max_hours:
             violations["weekly_hours"] += 1
     
+    # 检查重叠班次
+    violations["double_booking"] = len(find_double_bookings(schedule))
+    
     return violations
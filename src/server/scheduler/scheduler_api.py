@@ -1,11 +1,17 @@
 import sys
 import os
 import json
+import time
+import uuid
 import logging
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
-from scheduler import Employee, Shift, SchedulingAlgorithm, format_schedule_output, analyze_violations
+from scheduler import (
+    Employee, Shift, SchedulingAlgorithm, ScheduleCancelledError, format_schedule_output, analyze_violations
+)
+from shared_problem import solve_parallel
+from scoring_session import ScoringSession
 
 # 设置日志
 logging.basicConfig(
@@ -21,14 +27,18 @@ class ScheduleRequest:
     shifts: List[Dict[str, Any]]     # 班次列表
     sa_config: Optional[Dict[str, Any]] = None  # 模拟退火算法配置
     cost_params: Optional[Dict[str, Any]] = None  # 成本参数配置
+    previous_schedule: Optional[Dict[str, Any]] = None  # 已有排班结果（紧凑格式），用于输出差异和局部修复
+    changes: Optional[List[Dict[str, Any]]] = None  # 局部修复：变更列表
 
 @dataclass
 class ScheduleResponse:
     """排班响应数据类"""
-    schedule: List[Dict[str, Any]]  # 排班结果
+    schedule: Dict[str, Any]        # 排班结果（紧凑格式，见 format_schedule_output）
     cost: float                     # 总成本
     violations: Dict[str, int]      # 违规统计
     convergence_data: Dict[str, List[float]]  # 收敛数据
+    lower_bound: float = 0.0        # 成本下界
+    optimality_gap: float = 0.0     # 与下界的相对差距
 
 def _validate_time_format(time_str: str) -> Tuple[float, float]:
     """验证时间格式并返回小时和分钟"""
@@ -129,7 +139,8 @@ def _convert_employee(employee_data: Dict[str, Any]) -> Employee:
             max_daily_hours=float(employee_data.get('max_daily_hours', 8.0)),
             max_weekly_hours=float(employee_data.get('max_weekly_hours', 40.0)),
             phone=str(employee_data.get('phone', '')),
-            email=str(employee_data.get('email', ''))
+            email=str(employee_data.get('email', '')),
+            id=employee_data.get('id')
         )
         logger.debug(f"成功创建Employee对象: {employee}")
         return employee
@@ -151,7 +162,8 @@ def _convert_shift(shift_data: Dict[str, Any]) -> Shift:
             start_time=str(shift_data['start_time']),
             end_time=str(shift_data['end_time']),
             required_positions=dict(shift_data['required_positions']),
-            store=str(shift_data['store'])
+            store=str(shift_data['store']),
+            id=shift_data.get('id')
         )
         logger.debug(f"成功创建Shift对象: {shift}")
         return shift
@@ -159,33 +171,19 @@ def _convert_shift(shift_data: Dict[str, Any]) -> Shift:
         logger.error(f"转换班次数据失败: {str(e)}")
         raise
 
-def format_schedule_output(schedule: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """格式化排班结果输出"""
-    try:
-        formatted_schedule = []
-        for assignment in schedule:
-            # 确保所有必要字段都存在且类型正确
-            if not all(key in assignment for key in ['employee_id', 'shift_id', 'position']):
-                raise ValueError("排班结果缺少必要字段")
-            
-            formatted_assignment = {
-                'employee_id': int(assignment['employee_id']),
-                'shift_id': int(assignment['shift_id']),
-                'position': str(assignment['position'])
-            }
-            formatted_schedule.append(formatted_assignment)
-        return formatted_schedule
-    except Exception as e:
-        logger.error(f"格式化排班结果失败: {str(e)}")
-        raise
-
 def generate_schedule(
     employees_data: List[Dict[str, Any]],
     shifts_data: List[Dict[str, Any]],
     sa_config: Optional[Dict[str, Any]] = None,
-    cost_params: Optional[Dict[str, Any]] = None
+    cost_params: Optional[Dict[str, Any]] = None,
+    cancel_check: Optional[Callable[[], bool]] = None,
+    previous_schedule: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
-    """生成排班表的主函数"""
+    """生成排班表的主函数
+
+    cancel_check 返回 True 时求解在下一个温度步之间中止并抛出 ScheduleCancelledError。
+    提供 previous_schedule（紧凑格式）时，输出中附带与其相比的分配差异。
+    """
     try:
         logger.debug("开始生成排班表")
         logger.debug(f"员工数据数量: {len(employees_data)}")
@@ -202,13 +200,17 @@ def generate_schedule(
         
         # 创建调度算法实例
         logger.debug("创建调度算法实例...")
-        scheduler = SchedulingAlgorithm(employees, shifts, sa_config, cost_params)
+        scheduler = SchedulingAlgorithm(employees, shifts, sa_config, cost_params, cancel_check=cancel_check)
         logger.debug("调度算法实例创建成功")
         
-        # 运行模拟退火算法
-        logger.debug("开始运行模拟退火算法...")
-        schedule, cost, convergence_data = scheduler.simulated_annealing()
-        logger.debug(f"模拟退火算法完成，成本: {cost}")
+        # 运行搜索算法（按 sa_config.engine 选择模拟退火或禁忌搜索）
+        logger.debug("开始运行排班搜索算法...")
+        workers = int(scheduler.sa_config["workers"])
+        if workers > 1:
+            schedule, cost, convergence_data = solve_parallel(scheduler, workers)
+        else:
+            schedule, cost, convergence_data = scheduler.solve()
+        logger.debug(f"排班搜索算法完成，成本: {cost}")
         
         # 分析违规情况
         logger.debug("开始分析违规情况...")
@@ -217,30 +219,267 @@ def generate_schedule(
         
         # 格式化输出
         logger.debug("开始格式化输出...")
-        formatted_schedule = format_schedule_output(schedule)
+        previous_assignments = previous_schedule.get('assignments', []) if previous_schedule is not None else None
+        formatted_schedule = format_schedule_output(schedule, employees, previous_assignments)
         logger.debug("输出格式化完成")
         
         # 确保输出格式严格符合要求
         result = {
-            "schedule": formatted_schedule,  # 只包含必要的字段
+            "schedule": formatted_schedule,  # 员工表、班次表和 [班次ID, 员工ID, 职位] 分配
             "cost": float(cost),  # 确保是浮点数
+            "lower_bound": float(scheduler.compute_lower_bound()),  # 成本下界
+            "optimality_gap": float(scheduler.optimality_gap(cost)),  # 与下界的相对差距
             "violations": {str(k): int(v) for k, v in violations.items()},  # 确保键是字符串，值是整数
             "convergence_data": {
                 "temperatures": [float(t) for t in convergence_data.get('temperatures', [])],
-                "costs": [float(c) for c in convergence_data.get('costs', [])]
+                "current_costs": [float(c) for c in convergence_data.get('current_costs', [])],
+                "best_costs": [float(c) for c in convergence_data.get('best_costs', [])]
             }
         }
         logger.debug("排班表生成完成")
         return result
+    except ScheduleCancelledError:
+        logger.info("排班求解已取消")
+        raise
     except Exception as e:
         logger.error(f"生成排班表失败: {str(e)}")
         raise
 
+REPAIR_CHANGE_TYPES = ("employee_removed", "employee_unavailable", "shift_added", "demand_changed")
+
+def _assign_default_ids(items: List[Any]) -> None:
+    """未提供ID的员工或班次使用其在列表中的下标作为ID"""
+    for i, item in enumerate(items):
+        if item.id is None:
+            item.id = i
+
+def _build_previous_schedule(
+    shifts: List[Shift],
+    previous_schedule: Dict[str, Any],
+    employees: List[Employee]
+) -> List[Tuple[Shift, Dict[str, List[Employee]]]]:
+    """将紧凑格式的已有排班结果按班次列表顺序还原为算法内部的排班方案
+
+    已不在员工列表中的员工保留为占位对象；调用方需把其所在班次加入受影响班次，
+    由修复过程移除。
+    """
+    shifts_by_id = {shift.id: (idx, shift) for idx, shift in enumerate(shifts)}
+    employees_by_id = {e.id: e for e in employees}
+    schedule = [(shift, {}) for shift in shifts]
+    for shift_id, employee_id, position in previous_schedule.get('assignments', []):
+        if shift_id not in shifts_by_id:
+            raise ValueError(f"已有排班中的班次不存在: {shift_id}")
+        idx, shift = shifts_by_id[shift_id]
+        employee = employees_by_id.get(employee_id)
+        if employee is None:
+            employee = Employee(name=f"#{employee_id}", position=position, store=shift.store,
+                                workday_pref=(0, 6), time_pref=("00:00", "23:59"),
+                                max_daily_hours=24.0, max_weekly_hours=168.0, id=employee_id)
+        schedule[idx][1].setdefault(position, []).append(employee)
+    return schedule
+
+def repair_schedule(
+    employees_data: List[Dict[str, Any]],
+    shifts_data: List[Dict[str, Any]],
+    previous_schedule: Dict[str, Any],
+    changes: List[Dict[str, Any]],
+    sa_config: Optional[Dict[str, Any]] = None,
+    cost_params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """在已有排班结果（紧凑格式）上应用少量变更并做局部修复
+
+    支持的变更类型：
+        {"type": "employee_removed", "employee_id": 员工ID}
+        {"type": "employee_unavailable", "employee_id": 员工ID, "days": [日期, ...]}  # 省略 days 表示整周
+        {"type": "shift_added", "shift": 班次数据}  # 班次数据须带有与已有班次不重复的 id
+        {"type": "demand_changed", "shift_id": 班次ID, "required_positions": {职位: 人数}}
+
+    只重新优化受影响的班次，其余班次保持不变；返回新排班（附带与原排班的差异）、成本和违规统计。
+    """
+    try:
+        logger.debug(f"开始局部修复排班表，变更数量: {len(changes)}")
+
+        employees = [_convert_employee(emp) for emp in employees_data]
+        shifts = [_convert_shift(shift) for shift in shifts_data]
+        _assign_default_ids(employees)
+        _assign_default_ids(shifts)
+        employees_by_id = {e.id: e for e in employees}
+        previous = _build_previous_schedule(shifts, previous_schedule, employees)
+
+        removed: set = set()
+        unavailable: Dict[str, set] = {}
+        affected: set = set()
+        for change in changes:
+            change_type = change.get('type')
+            if change_type not in REPAIR_CHANGE_TYPES:
+                raise ValueError(f"未知的变更类型: {change_type}")
+            if change_type == 'employee_removed':
+                removed.add(change['employee_id'])
+            elif change_type == 'employee_unavailable':
+                employee = employees_by_id.get(change['employee_id'])
+                if employee is None:
+                    raise ValueError(f"员工不存在: {change['employee_id']}")
+                days = change.get('days')
+                unavailable.setdefault(employee.name, set()).update(
+                    range(7) if days is None else (int(d) for d in days)
+                )
+            elif change_type == 'shift_added':
+                shift = _convert_shift(change['shift'])
+                if shift.id is None:
+                    raise ValueError("新增班次缺少id")
+                if any(s.id == shift.id for s in shifts):
+                    raise ValueError(f"新增班次的id与已有班次重复: {shift.id}")
+                shifts.append(shift)
+                previous.append((shift, {}))
+                affected.add(len(shifts) - 1)
+            else:
+                shift_index = next((i for i, s in enumerate(shifts) if s.id == change['shift_id']), None)
+                if shift_index is None:
+                    raise ValueError(f"班次不存在: {change['shift_id']}")
+                shift = shifts[shift_index]
+                _validate_shift_data({
+                    'day': shift.day,
+                    'start_time': shift.start_time,
+                    'end_time': shift.end_time,
+                    'store': shift.store,
+                    'required_positions': change['required_positions'],
+                })
+                shift.required_positions = dict(change['required_positions'])
+                affected.add(shift_index)
+
+        # 含被移除、已不在员工列表中或不可上班员工的班次也需要修复
+        for idx, (shift, assignment) in enumerate(previous):
+            for workers in assignment.values():
+                for w in workers:
+                    if (w.id in removed or w.id not in employees_by_id
+                            or shift.day in unavailable.get(w.name, ())):
+                        affected.add(idx)
+
+        employees = [e for e in employees if e.id not in removed]
+        scheduler = SchedulingAlgorithm(employees, shifts, sa_config, cost_params)
+        schedule = scheduler.repair(previous, affected, unavailable)
+
+        cost = scheduler.calculate_cost(schedule)
+        violations = analyze_violations(schedule, employees)
+        result = {
+            "schedule": format_schedule_output(schedule, employees, previous_schedule.get('assignments', [])),
+            "cost": float(cost),
+            "violations": {str(k): int(v) for k, v in violations.items()},
+            "affected_shifts": [shifts[idx].id for idx in sorted(affected)],
+        }
+        logger.debug(f"局部修复完成，受影响班次: {len(affected)}")
+        return result
+    except Exception as e:
+        logger.error(f"局部修复排班表失败: {str(e)}")
+        raise
+
+# 评分会话的空闲过期时间（秒）和最大数量
+SCORING_SESSION_TTL = 1800
+MAX_SCORING_SESSIONS = 100
+
+class ScoringSessionNotFoundError(ValueError):
+    """评分会话不存在或已过期"""
+
+# 进程内的评分会话：会话ID -> (会话, 最近使用时间)，按最近使用顺序排列
+_scoring_sessions: Dict[str, Tuple[ScoringSession, float]] = {}
+
+def _expire_scoring_sessions() -> None:
+    """清除空闲超时的评分会话；数量超过上限时清除最久未使用的会话"""
+    deadline = time.monotonic() - SCORING_SESSION_TTL
+    for session_id in [sid for sid, (_, last_used) in _scoring_sessions.items() if last_used < deadline]:
+        del _scoring_sessions[session_id]
+        logger.debug(f"评分会话已过期 {session_id}")
+    while len(_scoring_sessions) > MAX_SCORING_SESSIONS:
+        session_id = next(iter(_scoring_sessions))
+        del _scoring_sessions[session_id]
+        logger.debug(f"评分会话数量超过上限，清除 {session_id}")
+
+def open_scoring_session(
+    employees_data: List[Dict[str, Any]],
+    shifts_data: List[Dict[str, Any]],
+    schedule: Dict[str, Any],
+    cost_params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """载入排班方案（紧凑格式）并创建评分会话，返回会话ID、成本和违规统计"""
+    if not isinstance(schedule, dict) or not isinstance(schedule.get('assignments', []), list):
+        raise ValueError("schedule 必须是包含 assignments 列表的对象")
+    employees = [_convert_employee(emp) for emp in employees_data]
+    shifts = [_convert_shift(shift) for shift in shifts_data]
+    session = ScoringSession(employees, shifts, schedule.get('assignments', []), cost_params)
+    session_id = uuid.uuid4().hex
+    _scoring_sessions[session_id] = (session, time.monotonic())
+    _expire_scoring_sessions()
+    logger.debug(f"创建评分会话 {session_id}")
+    return {"session_id": session_id, **session.summary()}
+
+def score_edits(session_id: str, edits: List[Dict[str, Any]], apply: bool = False) -> Dict[str, Any]:
+    """评估一批手工调整，返回每个调整的成本变化和变化的违规项
+
+    apply 为 False 时每个调整都相对会话当前方案独立评估；为 True 时依次应用到会话中。
+    会话空闲超过 SCORING_SESSION_TTL 秒后过期，需要重新创建。
+    """
+    if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+        raise ValueError("edits 必须是调整对象的列表")
+    _expire_scoring_sessions()
+    entry = _scoring_sessions.pop(session_id, None)
+    if entry is None:
+        raise ScoringSessionNotFoundError(f"评分会话不存在或已过期: {session_id}")
+    session = entry[0]
+    _scoring_sessions[session_id] = (session, time.monotonic())
+    return {"results": session.evaluate_batch(edits, apply=apply), **session.summary()}
+
+def close_scoring_session(session_id: str) -> Dict[str, Any]:
+    """关闭评分会话"""
+    return {"closed": _scoring_sessions.pop(session_id, None) is not None}
+
+def serve() -> None:
+    """常驻模式：逐行读取 JSON 请求，逐行输出 JSON 响应，评分会话在进程内保持
+
+    请求格式：
+        {"action": "open_session", "employees": [...], "shifts": [...], "schedule": {...}, "cost_params": {...}}
+        {"action": "score", "session_id": ..., "edits": [...], "apply": false}
+        {"action": "close_session", "session_id": ...}
+
+    出错时响应为 {"error": 错误信息, "code": 错误类型}，错误类型为：
+        session_not_found  评分会话不存在或已过期，需要重新创建
+        invalid_request    请求格式或内容错误
+        internal_error     其他错误
+    """
+    actions = {
+        "open_session": lambda r: open_scoring_session(r['employees'], r['shifts'], r['schedule'], r.get('cost_params')),
+        "score": lambda r: score_edits(r['session_id'], r['edits'], bool(r.get('apply', False))),
+        "close_session": lambda r: close_scoring_session(r['session_id']),
+    }
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            action = request.get('action')
+            if action not in actions:
+                raise ValueError(f"未知的操作: {action}")
+            response = actions[action](request)
+        except ScoringSessionNotFoundError as e:
+            logger.info(str(e))
+            response = {"error": str(e), "code": "session_not_found"}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"处理请求失败: {str(e)}")
+            response = {"error": str(e), "code": "invalid_request"}
+        except Exception as e:
+            logger.error(f"处理请求失败: {str(e)}")
+            response = {"error": str(e), "code": "internal_error"}
+        print(json.dumps(response, ensure_ascii=False), flush=True)
+
 # 使用示例
 if __name__ == "__main__":
     # 如果有命令行参数 --help，输出帮助
     if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
         print("用法: cat request.json | python3 scheduler_api.py")
+        print("      python3 scheduler_api.py --serve    # 常驻评分模式，逐行读写 JSON")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
         sys.exit(0)
 
     # 从标准输入读取JSON
@@ -257,9 +496,16 @@ if __name__ == "__main__":
         request = ScheduleRequest(**request_dict)
         logger.debug("ScheduleRequest对象创建成功")
         
-        logger.debug("开始生成排班表...")
-        response = generate_schedule(request.employees, request.shifts, request.sa_config, request.cost_params)
-        logger.debug("排班表生成成功")
+        if request.changes is not None:
+            logger.debug("开始局部修复排班表...")
+            response = repair_schedule(request.employees, request.shifts, request.previous_schedule or {},
+                                       request.changes, request.sa_config, request.cost_params)
+            logger.debug("排班表修复成功")
+        else:
+            logger.debug("开始生成排班表...")
+            response = generate_schedule(request.employees, request.shifts, request.sa_config, request.cost_params,
+                                         previous_schedule=request.previous_schedule)
+            logger.debug("排班表生成成功")
         
         # 输出JSON结果
         logger.debug("开始输出结果...")
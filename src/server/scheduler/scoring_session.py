@@ -0,0 +1,243 @@
+import logging
+from typing import Dict, List, Tuple, Any, Optional
+
+from scheduler import (
+    Employee, Shift, SchedulingAlgorithm, calculate_shift_duration, shift_interval, count_overlaps
+)
+
+logger = logging.getLogger('StandaloneScheduler.scoring_session')
+
+# 违规类型 -> 对应的成本参数
+VIOLATION_COST_KEYS = {
+    "understaff": "understaff_penalty",
+    "workday_pref": "workday_violation",
+    "time_pref": "time_pref_violation",
+    "daily_hours": "daily_hours_violation",
+    "weekly_hours": "weekly_hours_violation",
+    "double_booking": "double_booking",
+}
+
+# 违规以元组为键：(类型, 定位字段...)，值为次数（缺员为缺少人数）
+ViolationKey = Tuple[Any, ...]
+
+
+class ScoringSession:
+    """排班评分会话
+
+    一次性载入排班方案，之后对手工调整（增加、移除、移动、交换员工）做增量评估：
+    只重新计算受影响的班次-职位、分配和员工-日期，返回成本变化和变化的违规项。
+    成本口径与 SchedulingAlgorithm.calculate_cost 一致。
+    """
+
+    def __init__(self, employees: List[Employee], shifts: List[Shift],
+                 assignments: List[Tuple[Any, Any, str]], cost_params: Optional[Dict[str, Any]] = None):
+        # 复用算法类的参数默认值、ID 补齐和偏好检查
+        self.scheduler = SchedulingAlgorithm(employees, shifts, cost_params=cost_params)
+        self.cost_params = self.scheduler.cost_params
+        self.employees = {e.id: e for e in employees}
+        self.shifts = {s.id: s for s in shifts}
+        self.intervals = {s.id: shift_interval(s) for s in shifts}
+        # 工时以整数分钟累计，避免反复增减产生浮点误差
+        self.minutes = {s.id: round(calculate_shift_duration(s) * 60) for s in shifts}
+
+        # 班次ID -> 职位 -> 员工ID列表
+        self.assignment: Dict[Any, Dict[str, List[Any]]] = {s.id: {} for s in shifts}
+        # 员工工时与当天的班次
+        self.weekly_minutes: Dict[Any, int] = {e.id: 0 for e in employees}
+        self.daily_minutes: Dict[Any, List[int]] = {e.id: [0] * 7 for e in employees}
+        self.day_shifts: Dict[Tuple[Any, int], List[Any]] = {}
+
+        for shift_id, employee_id, position in assignments:
+            self._add(shift_id, employee_id, position)
+
+        self.violations = self._all_violations()
+        self.cost = self._violations_cost(self.violations)
+        logger.debug(f"评分会话已载入，成本: {self.cost}")
+
+    # ---- 状态维护 ----
+
+    def _check_ids(self, shift_id: Any, employee_id: Any) -> None:
+        if shift_id not in self.shifts:
+            raise ValueError(f"班次不存在: {shift_id}")
+        if employee_id not in self.employees:
+            raise ValueError(f"员工不存在: {employee_id}")
+
+    def _add(self, shift_id: Any, employee_id: Any, position: str) -> None:
+        """把员工加入班次的某个职位"""
+        self._check_ids(shift_id, employee_id)
+        workers = self.assignment[shift_id].setdefault(position, [])
+        if employee_id in workers:
+            raise ValueError(f"员工{employee_id}已在班次{shift_id}的{position}中")
+        workers.append(employee_id)
+        day = self.intervals[shift_id][0]
+        self.weekly_minutes[employee_id] += self.minutes[shift_id]
+        self.daily_minutes[employee_id][day] += self.minutes[shift_id]
+        self.day_shifts.setdefault((employee_id, day), []).append(shift_id)
+
+    def _remove(self, shift_id: Any, employee_id: Any, position: str) -> None:
+        """把员工从班次的某个职位移除"""
+        self._check_ids(shift_id, employee_id)
+        workers = self.assignment[shift_id].get(position, [])
+        if employee_id not in workers:
+            raise ValueError(f"员工{employee_id}不在班次{shift_id}的{position}中")
+        workers.remove(employee_id)
+        day = self.intervals[shift_id][0]
+        self.weekly_minutes[employee_id] -= self.minutes[shift_id]
+        self.daily_minutes[employee_id][day] -= self.minutes[shift_id]
+        self.day_shifts[(employee_id, day)].remove(shift_id)
+
+    # ---- 违规计算 ----
+
+    def _shift_position_violations(self, shift_id: Any, position: str) -> Dict[ViolationKey, int]:
+        required = self.shifts[shift_id].required_positions.get(position, 0)
+        shortage = required - len(self.assignment[shift_id].get(position, []))
+        return {("understaff", shift_id, position): shortage} if shortage > 0 else {}
+
+    def _assignment_violations(self, shift_id: Any, employee_id: Any, position: str) -> Dict[ViolationKey, int]:
+        employee, shift = self.employees[employee_id], self.shifts[shift_id]
+        violations = {}
+        if self.scheduler._check_workday_preference(employee, shift, []):
+            violations[("workday_pref", shift_id, employee_id, position)] = 1
+        if self.scheduler._check_time_preference(employee, shift, []):
+            violations[("time_pref", shift_id, employee_id, position)] = 1
+        return violations
+
+    def _employee_violations(self, employee_id: Any, days: List[int]) -> Dict[ViolationKey, int]:
+        employee = self.employees[employee_id]
+        violations = {}
+        if self.weekly_minutes[employee_id] / 60.0 > employee.max_weekly_hours:
+            violations[("weekly_hours", employee_id)] = 1
+        for day in days:
+            if self.daily_minutes[employee_id][day] / 60.0 > employee.max_daily_hours:
+                violations[("daily_hours", employee_id, day)] = 1
+            shift_ids = self.day_shifts.get((employee_id, day), [])
+            overlaps = count_overlaps([self.intervals[s][1:] for s in shift_ids])
+            if overlaps:
+                violations[("double_booking", employee_id, day)] = overlaps
+        return violations
+
+    def _all_violations(self) -> Dict[ViolationKey, int]:
+        violations = {}
+        for shift_id, shift in self.shifts.items():
+            for position in shift.required_positions:
+                violations.update(self._shift_position_violations(shift_id, position))
+            for position, workers in self.assignment[shift_id].items():
+                for employee_id in workers:
+                    violations.update(self._assignment_violations(shift_id, employee_id, position))
+        for employee_id in self.employees:
+            violations.update(self._employee_violations(employee_id, list(range(7))))
+        return violations
+
+    def _violations_cost(self, violations: Dict[ViolationKey, int]) -> float:
+        return sum(count * self.cost_params[VIOLATION_COST_KEYS[key[0]]] for key, count in violations.items())
+
+    # ---- 调整评估 ----
+
+    def _expand_edit(self, edit: Dict[str, Any]) -> List[Tuple[str, Any, Any, str]]:
+        """将一次调整展开为 (add/remove, 班次ID, 员工ID, 职位) 序列
+
+        支持的调整：
+            {"op": "add", "shift_id", "employee_id", "position"}
+            {"op": "remove", "shift_id", "employee_id", "position"}
+            {"op": "move", "employee_id", "from_shift_id", "to_shift_id", "position", "to_position"(可选)}
+            {"op": "swap", "position", "shift_id_a", "employee_id_a", "shift_id_b", "employee_id_b"}
+        """
+        op = edit.get("op")
+        if op in ("add", "remove"):
+            return [(op, edit["shift_id"], edit["employee_id"], edit["position"])]
+        if op == "move":
+            to_position = edit.get("to_position", edit["position"])
+            return [
+                ("remove", edit["from_shift_id"], edit["employee_id"], edit["position"]),
+                ("add", edit["to_shift_id"], edit["employee_id"], to_position),
+            ]
+        if op == "swap":
+            position = edit["position"]
+            return [
+                ("remove", edit["shift_id_a"], edit["employee_id_a"], position),
+                ("remove", edit["shift_id_b"], edit["employee_id_b"], position),
+                ("add", edit["shift_id_a"], edit["employee_id_b"], position),
+                ("add", edit["shift_id_b"], edit["employee_id_a"], position),
+            ]
+        raise ValueError(f"未知的调整类型: {op}")
+
+    def _touched_violations(self, steps: List[Tuple[str, Any, Any, str]]) -> Dict[ViolationKey, int]:
+        """受本次调整影响的违规项在当前状态下的取值"""
+        violations = {}
+        employee_days: Dict[Any, set] = {}
+        for _, shift_id, employee_id, position in steps:
+            violations.update(self._shift_position_violations(shift_id, position))
+            if employee_id in self.assignment[shift_id].get(position, []):
+                violations.update(self._assignment_violations(shift_id, employee_id, position))
+            employee_days.setdefault(employee_id, set()).add(self.intervals[shift_id][0])
+        for employee_id, days in employee_days.items():
+            violations.update(self._employee_violations(employee_id, sorted(days)))
+        return violations
+
+    def _apply_steps(self, steps: List[Tuple[str, Any, Any, str]]) -> None:
+        """依次执行展开后的调整，失败时回滚已执行的部分"""
+        done = []
+        try:
+            for step in steps:
+                action, shift_id, employee_id, position = step
+                if action == "add":
+                    self._add(shift_id, employee_id, position)
+                else:
+                    self._remove(shift_id, employee_id, position)
+                done.append(step)
+        except Exception:
+            self._revert_steps(done)
+            raise
+
+    def _revert_steps(self, steps: List[Tuple[str, Any, Any, str]]) -> None:
+        for action, shift_id, employee_id, position in reversed(steps):
+            if action == "add":
+                self._remove(shift_id, employee_id, position)
+            else:
+                self._add(shift_id, employee_id, position)
+
+    def evaluate(self, edit: Dict[str, Any], apply: bool = False) -> Dict[str, Any]:
+        """评估一次调整，返回成本变化和变化的违规项；apply 为 True 时保留调整"""
+        steps = self._expand_edit(edit)
+        for _, shift_id, employee_id, _ in steps:
+            self._check_ids(shift_id, employee_id)
+
+        before = self._touched_violations(steps)
+        self._apply_steps(steps)
+        after = self._touched_violations(steps)
+        if not apply:
+            self._revert_steps(steps)
+
+        delta = self._violations_cost(after) - self._violations_cost(before)
+        added = [list(key) + [count] for key, count in after.items() if before.get(key) != count]
+        resolved = [list(key) + [count] for key, count in before.items() if key not in after]
+
+        if apply:
+            for key in before:
+                self.violations.pop(key, None)
+            self.violations.update(after)
+            self.cost += delta
+
+        return {
+            "cost_delta": float(delta),
+            "cost": float(self.cost if apply else self.cost + delta),
+            "violations_added": added,
+            "violations_resolved": resolved,
+        }
+
+    def evaluate_batch(self, edits: List[Dict[str, Any]], apply: bool = False) -> List[Dict[str, Any]]:
+        """逐个评估一批调整；apply 为 False 时每个调整都相对当前方案独立评估"""
+        results = []
+        for edit in edits:
+            try:
+                results.append(self.evaluate(edit, apply=apply))
+            except (ValueError, KeyError) as e:
+                results.append({"error": str(e)})
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        """当前方案的成本和按类型统计的违规数量"""
+        counts = {kind: 0 for kind in VIOLATION_COST_KEYS}
+        for key, count in self.violations.items():
+            counts[key[0]] += count
+        return {"cost": float(self.cost), "violations": counts}
@@ -0,0 +1,557 @@
+import json
+import math
+import random
+import logging
+import multiprocessing
+from array import array
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple, Any, Optional
+
+from scheduler import (
+    Employee, Shift, SchedulingAlgorithm, time_to_minutes, calculate_shift_duration, count_overlaps
+)
+
+logger = logging.getLogger('StandaloneScheduler.shared_problem')
+
+# 各数组的元素类型（array 模块类型码）
+ARRAY_TYPES = {
+    # 员工
+    "emp_store": "i",
+    "emp_position": "i",
+    "emp_workday_start": "i",
+    "emp_workday_end": "i",
+    "emp_time_start": "i",  # 分钟
+    "emp_time_end": "i",  # 分钟
+    "emp_max_daily": "d",
+    "emp_max_weekly": "d",
+    # 班次
+    "shift_day": "i",
+    "shift_start": "i",  # 分钟
+    "shift_end": "i",  # 分钟
+    "shift_store": "i",
+    "shift_duration": "d",
+    # 需求矩阵：班次数 x 职位数，按行展开；-1 表示班次不含该职位
+    "demand": "i",
+    # 门店-职位分组（组号 = 门店下标 * 职位数 + 职位下标）的员工列表，CSR 格式
+    "group_offsets": "i",
+    "group_employees": "i",
+    # 初始解：按 (班次下标, 职位下标, 员工下标) 展开
+    "initial": "i",
+}
+
+# 每段数据按 8 字节对齐
+ALIGNMENT = 8
+
+
+def _minutes_to_time(minutes: int) -> str:
+    """将分钟数转换为 HH:MM"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def compile_problem(employees: List[Employee], shifts: List[Shift], positions: List[str],
+                    initial: Optional[List[Tuple[int, int, int]]] = None) -> Tuple[Dict[str, array], Dict[str, List[str]]]:
+    """将员工和班次编译为定长数值数组，以及一份字符串表
+
+    initial 为可选的初始解（encode_schedule 的输出），供工作进程的数组退火使用。
+    """
+    stores = sorted({e.store for e in employees} | {s.store for s in shifts})
+    store_index = {store: i for i, store in enumerate(stores)}
+    position_index = {p: i for i, p in enumerate(positions)}
+
+    arrays = {name: array(code) for name, code in ARRAY_TYPES.items()}
+    for e in employees:
+        arrays["emp_store"].append(store_index[e.store])
+        arrays["emp_position"].append(position_index[e.position])
+        arrays["emp_workday_start"].append(e.workday_pref[0])
+        arrays["emp_workday_end"].append(e.workday_pref[1])
+        arrays["emp_time_start"].append(time_to_minutes(e.time_pref[0]))
+        arrays["emp_time_end"].append(time_to_minutes(e.time_pref[1]))
+        arrays["emp_max_daily"].append(e.max_daily_hours)
+        arrays["emp_max_weekly"].append(e.max_weekly_hours)
+
+    for s in shifts:
+        arrays["shift_day"].append(s.day)
+        arrays["shift_start"].append(time_to_minutes(s.start_time))
+        arrays["shift_end"].append(time_to_minutes(s.end_time))
+        arrays["shift_store"].append(store_index[s.store])
+        arrays["shift_duration"].append(calculate_shift_duration(s))
+        row = [-1] * len(positions)
+        for position, count in s.required_positions.items():
+            row[position_index[position]] = int(count)
+        arrays["demand"].extend(row)
+
+    groups: List[List[int]] = [[] for _ in range(len(stores) * len(positions))]
+    for i, e in enumerate(employees):
+        groups[store_index[e.store] * len(positions) + position_index[e.position]].append(i)
+    arrays["group_offsets"].append(0)
+    for members in groups:
+        arrays["group_employees"].extend(members)
+        arrays["group_offsets"].append(len(arrays["group_employees"]))
+
+    for triple in initial or []:
+        arrays["initial"].extend(triple)
+
+    strings = {
+        "names": [e.name for e in employees],
+        "positions": list(positions),
+        "stores": stores,
+    }
+    return arrays, strings
+
+
+class SharedProblem:
+    """放在共享内存中的编译后排班问题
+
+    由父进程创建并持有；工作进程通过 descriptor（只包含共享内存名称和各段偏移，
+    大小与员工、班次数量无关）以只读方式挂载。用完后需调用 close()。
+    """
+
+    def __init__(self, employees: List[Employee], shifts: List[Shift], positions: List[str],
+                 initial: Optional[List[Tuple[int, int, int]]] = None):
+        arrays, strings = compile_problem(employees, shifts, positions, initial)
+        blob = json.dumps(strings, ensure_ascii=False).encode("utf-8")
+
+        # 计算各段偏移
+        layout = {}
+        offset = 0
+        for name, arr in arrays.items():
+            layout[name] = (offset, len(arr))
+            offset += -(-len(arr) * arr.itemsize // ALIGNMENT) * ALIGNMENT
+        strings_offset = offset
+        size = max(1, offset + len(blob))
+
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        for name, arr in arrays.items():
+            start = layout[name][0]
+            raw = arr.tobytes()
+            self.shm.buf[start:start + len(raw)] = raw
+        self.shm.buf[strings_offset:strings_offset + len(blob)] = blob
+
+        self.descriptor = {
+            "shm_name": self.shm.name,
+            "layout": layout,
+            "strings": (strings_offset, len(blob)),
+            "num_employees": len(employees),
+            "num_shifts": len(shifts),
+            "num_positions": len(positions),
+        }
+        logger.debug(f"共享问题数据已创建: {self.shm.name}, {size}字节")
+
+    def close(self) -> None:
+        """释放并删除共享内存"""
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> 'SharedProblem':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """以非所有者身份挂载共享内存
+
+    工作进程与父进程共用同一个资源跟踪器，重复登记不会产生额外记录，
+    删除仍由父进程负责；Python 3.13 起可直接关闭跟踪。
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_problem(descriptor: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, Dict[str, memoryview], Dict[str, List[str]]]:
+    """挂载共享问题数据，返回共享内存对象、各数组的只读视图和字符串表"""
+    shm = _attach_shared_memory(descriptor["shm_name"])
+    buf = shm.buf.toreadonly()
+    views = {}
+    for name, (offset, length) in descriptor["layout"].items():
+        code = ARRAY_TYPES[name]
+        itemsize = array(code).itemsize
+        views[name] = buf[offset:offset + length * itemsize].cast(code)
+    strings_offset, strings_length = descriptor["strings"]
+    strings = json.loads(bytes(buf[strings_offset:strings_offset + strings_length]).decode("utf-8"))
+    return shm, views, strings
+
+
+def build_problem_objects(descriptor: Dict[str, Any], views: Dict[str, memoryview],
+                          strings: Dict[str, List[str]]) -> Tuple[List[Employee], List[Shift]]:
+    """根据共享数组重建算法使用的员工和班次对象
+
+    员工名、职位和门店来自字符串表；时间统一还原为 HH:MM。
+    """
+    names, positions, stores = strings["names"], strings["positions"], strings["stores"]
+    num_positions = descriptor["num_positions"]
+
+    employees = [
+        Employee(
+            name=names[i],
+            position=positions[views["emp_position"][i]],
+            store=stores[views["emp_store"][i]],
+            workday_pref=(views["emp_workday_start"][i], views["emp_workday_end"][i]),
+            time_pref=(_minutes_to_time(views["emp_time_start"][i]), _minutes_to_time(views["emp_time_end"][i])),
+            max_daily_hours=views["emp_max_daily"][i],
+            max_weekly_hours=views["emp_max_weekly"][i],
+        )
+        for i in range(descriptor["num_employees"])
+    ]
+
+    demand = views["demand"]
+    shifts = []
+    for i in range(descriptor["num_shifts"]):
+        row = demand[i * num_positions:(i + 1) * num_positions]
+        shifts.append(Shift(
+            day=views["shift_day"][i],
+            start_time=_minutes_to_time(views["shift_start"][i]),
+            end_time=_minutes_to_time(views["shift_end"][i]),
+            required_positions={positions[p]: row[p] for p in range(num_positions) if row[p] >= 0},
+            store=stores[views["shift_store"][i]],
+        ))
+    return employees, shifts
+
+
+class ArrayAnnealer:
+    """直接在共享数组上运行的模拟退火（工作进程使用）
+
+    问题数据只从共享内存的只读视图读取，不重建 Employee/Shift 对象和 SchedulingAlgorithm；
+    进程内只保存当前解、最优解和员工工时统计。成本口径与 SchedulingAlgorithm.calculate_cost
+    一致（工时以整数分钟累计），邻域操作与 generate_neighbor 相同（替换、交换、移动），
+    每次移动只重新计算受影响的班次-职位、分配和员工-日期。
+    """
+
+    def __init__(self, descriptor: Dict[str, Any], views: Dict[str, memoryview],
+                 sa_config: Dict[str, Any], cost_params: Dict[str, Any], lower_bound: float):
+        self.views = views
+        self.num_shifts = descriptor["num_shifts"]
+        self.num_positions = descriptor["num_positions"]
+        self.sa_config = sa_config
+        self.cost_params = cost_params
+        self.lower_bound = lower_bound
+
+        # 当前解：班次下标 -> 职位下标 -> 员工下标列表（只含班次需要的职位）
+        demand = views["demand"]
+        self.assignment: List[Dict[int, List[int]]] = [
+            {p: [] for p in range(self.num_positions) if demand[s * self.num_positions + p] >= 0}
+            for s in range(self.num_shifts)
+        ]
+        # 员工每周、每天的工时（分钟），以及每天的班次下标
+        self.week_minutes = [0] * descriptor["num_employees"]
+        self.day_minutes = [0] * (descriptor["num_employees"] * 7)
+        self.day_shifts: Dict[int, List[int]] = {}
+
+        initial = views["initial"]
+        for i in range(0, len(initial), 3):
+            self._add(initial[i], initial[i + 1], initial[i + 2])
+
+    # ---- 状态维护 ----
+
+    def _minutes(self, s: int) -> int:
+        return self.views["shift_end"][s] - self.views["shift_start"][s]
+
+    def _add(self, s: int, p: int, e: int) -> None:
+        self.assignment[s][p].append(e)
+        key = e * 7 + self.views["shift_day"][s]
+        minutes = self._minutes(s)
+        self.week_minutes[e] += minutes
+        self.day_minutes[key] += minutes
+        self.day_shifts.setdefault(key, []).append(s)
+
+    def _remove(self, s: int, p: int, e: int) -> None:
+        self.assignment[s][p].remove(e)
+        key = e * 7 + self.views["shift_day"][s]
+        minutes = self._minutes(s)
+        self.week_minutes[e] -= minutes
+        self.day_minutes[key] -= minutes
+        self.day_shifts[key].remove(s)
+
+    def _apply(self, steps: List[Tuple[bool, int, int, int]]) -> None:
+        for is_add, s, p, e in steps:
+            if is_add:
+                self._add(s, p, e)
+            else:
+                self._remove(s, p, e)
+
+    def _revert(self, steps: List[Tuple[bool, int, int, int]]) -> None:
+        for is_add, s, p, e in reversed(steps):
+            if is_add:
+                self._remove(s, p, e)
+            else:
+                self._add(s, p, e)
+
+    def _has_conflict(self, e: int, s: int, ignore: int) -> bool:
+        """员工当天是否有与班次 s 时间重叠的其他班次（忽略班次 ignore）"""
+        views = self.views
+        start, end = views["shift_start"][s], views["shift_end"][s]
+        for other in self.day_shifts.get(e * 7 + views["shift_day"][s], ()):
+            if other != ignore and views["shift_start"][other] < end and start < views["shift_end"][other]:
+                return True
+        return False
+
+    # ---- 成本 ----
+
+    def _understaff_cost(self, s: int, p: int) -> float:
+        shortage = self.views["demand"][s * self.num_positions + p] - len(self.assignment[s][p])
+        return shortage * self.cost_params["understaff_penalty"] if shortage > 0 else 0
+
+    def _preference_cost(self, s: int, e: int) -> float:
+        views = self.views
+        cost = 0
+        if not (views["emp_workday_start"][e] <= views["shift_day"][s] <= views["emp_workday_end"][e]):
+            cost += self.cost_params["workday_violation"]
+        if views["shift_start"][s] < views["emp_time_start"][e] or views["shift_end"][s] > views["emp_time_end"][e]:
+            cost += self.cost_params["time_pref_violation"]
+        return cost
+
+    def _employee_day_cost(self, key: int) -> float:
+        e = key // 7
+        cost = 0
+        if self.day_minutes[key] / 60.0 > self.views["emp_max_daily"][e]:
+            cost += self.cost_params["daily_hours_violation"]
+        shift_ids = self.day_shifts.get(key)
+        if shift_ids and len(shift_ids) > 1:
+            views = self.views
+            overlaps = count_overlaps([(views["shift_start"][s], views["shift_end"][s]) for s in shift_ids])
+            cost += overlaps * self.cost_params["double_booking"]
+        return cost
+
+    def _employee_week_cost(self, e: int) -> float:
+        if self.week_minutes[e] / 60.0 > self.views["emp_max_weekly"][e]:
+            return self.cost_params["weekly_hours_violation"]
+        return 0
+
+    def total_cost(self) -> float:
+        cost = 0
+        for s, positions in enumerate(self.assignment):
+            for p, workers in positions.items():
+                cost += self._understaff_cost(s, p)
+                for e in workers:
+                    cost += self._preference_cost(s, e)
+        for key in self.day_shifts:
+            cost += self._employee_day_cost(key)
+        for e in range(len(self.week_minutes)):
+            cost += self._employee_week_cost(e)
+        return cost
+
+    def _touched_cost(self, steps: List[Tuple[bool, int, int, int]]) -> float:
+        """受移动影响的班次-职位、员工-日期和员工周工时成本"""
+        slots = {(s, p) for _, s, p, _ in steps}
+        keys = {e * 7 + self.views["shift_day"][s] for _, s, _, e in steps}
+        employees = {e for _, _, _, e in steps}
+        return (sum(self._understaff_cost(s, p) for s, p in slots)
+                + sum(self._employee_day_cost(key) for key in keys)
+                + sum(self._employee_week_cost(e) for e in employees))
+
+    def _move_delta(self, steps: List[Tuple[bool, int, int, int]]) -> float:
+        """执行移动并返回成本变化"""
+        before = self._touched_cost(steps)
+        self._apply(steps)
+        after = self._touched_cost(steps)
+        preference = sum(
+            self._preference_cost(s, e) if is_add else -self._preference_cost(s, e)
+            for is_add, s, _, e in steps
+        )
+        return after - before + preference
+
+    # ---- 邻域 ----
+
+    def _group(self, store: int, p: int) -> memoryview:
+        offsets = self.views["group_offsets"]
+        g = store * self.num_positions + p
+        return self.views["group_employees"][offsets[g]:offsets[g + 1]]
+
+    def _neighbor_replace(self) -> List[Tuple[bool, int, int, int]]:
+        s = random.randrange(self.num_shifts)
+        positions = list(self.assignment[s].keys())
+        if not positions:
+            return []
+        p = random.choice(positions)
+        workers = self.assignment[s][p]
+        steps = []
+        remaining = list(workers)
+        if workers:
+            removed = remaining.pop(random.randrange(len(remaining)))
+            steps.append((False, s, p, removed))
+        candidates = [
+            e for e in self._group(self.views["shift_store"][s], p)
+            if e not in remaining and not self._has_conflict(e, s, ignore=s)
+        ]
+        if candidates:
+            steps.append((True, s, p, random.choice(candidates)))
+        return steps
+
+    def _neighbor(self) -> List[Tuple[bool, int, int, int]]:
+        """生成相邻解对应的 (是否加入, 班次, 职位, 员工) 步骤序列"""
+        operation_type = random.choice(["swap", "replace", "move"])
+        if operation_type == "replace" or self.num_shifts < 2:
+            return self._neighbor_replace()
+
+        views = self.views
+        s1, s2 = random.sample(range(self.num_shifts), 2)
+        assignment1, assignment2 = self.assignment[s1], self.assignment[s2]
+
+        if operation_type == "swap":
+            common_positions = [p for p in assignment1 if p in assignment2]
+            if not common_positions:
+                return self._neighbor_replace()
+            p = random.choice(common_positions)
+            workers1, workers2 = assignment1[p], assignment2[p]
+            if not workers1 or not workers2:
+                return self._neighbor_replace()
+            e1 = workers1[random.randrange(len(workers1))]
+            e2 = workers2[random.randrange(len(workers2))]
+            if not (views["emp_store"][e1] == views["shift_store"][s2] and
+                    views["emp_store"][e2] == views["shift_store"][s1]):
+                return self._neighbor_replace()
+            if self._has_conflict(e1, s2, ignore=s1) or self._has_conflict(e2, s1, ignore=s2):
+                return self._neighbor_replace()
+            return [(False, s1, p, e1), (False, s2, p, e2), (True, s1, p, e2), (True, s2, p, e1)]
+
+        if not assignment1:
+            return self._neighbor_replace()
+        p = random.choice(list(assignment1.keys()))
+        workers1 = assignment1[p]
+        if not workers1:
+            return self._neighbor_replace()
+        e = workers1[random.randrange(len(workers1))]
+        if not (p in assignment2 and
+                views["emp_store"][e] == views["shift_store"][s2] and
+                not self._has_conflict(e, s2, ignore=s1)):
+            return self._neighbor_replace()
+        return [(False, s1, p, e), (True, s2, p, e)]
+
+    # ---- 搜索 ----
+
+    def _reached_optimality_gap(self, cost: float) -> bool:
+        """与 SchedulingAlgorithm.optimality_gap 相同的提前结束判断"""
+        gap = 0.0 if cost <= 0 else max(0.0, (cost - self.lower_bound) / cost)
+        return gap <= self.sa_config["optimality_gap"]
+
+    def assignments(self) -> List[Tuple[int, int, int]]:
+        """当前解的 (班次下标, 职位下标, 员工下标) 列表"""
+        return [(s, p, e) for s, positions in enumerate(self.assignment)
+                for p, workers in positions.items() for e in workers]
+
+    def simulated_annealing(self) -> Tuple[float, List[Tuple[int, int, int]], Dict[str, List[float]]]:
+        """与 SchedulingAlgorithm.simulated_annealing 相同的退火流程，返回最低成本、其分配和收敛数据"""
+        convergence_data = {"temperatures": [], "current_costs": [], "best_costs": []}
+        current_cost = self.total_cost()
+        best_cost = current_cost
+        best_assignments = self.assignments()
+
+        temperature = self.sa_config["initial_temp"]
+        convergence_data["temperatures"].append(temperature)
+        convergence_data["current_costs"].append(current_cost)
+        convergence_data["best_costs"].append(best_cost)
+
+        reached_gap = self._reached_optimality_gap(best_cost)
+        while temperature > self.sa_config["min_temp"] and not reached_gap:
+            for _ in range(self.sa_config["iter_per_temp"]):
+                steps = self._neighbor()
+                cost_diff = self._move_delta(steps)
+                if cost_diff < 0 or random.random() < math.exp(-cost_diff / temperature):
+                    current_cost += cost_diff
+                    if current_cost < best_cost:
+                        best_cost = current_cost
+                        best_assignments = self.assignments()
+                        reached_gap = self._reached_optimality_gap(best_cost)
+                else:
+                    self._revert(steps)
+                if reached_gap:
+                    break
+
+            convergence_data["temperatures"].append(temperature)
+            convergence_data["current_costs"].append(current_cost)
+            convergence_data["best_costs"].append(best_cost)
+            temperature *= self.sa_config["cooling_rate"]
+
+        return best_cost, best_assignments, convergence_data
+
+
+def uses_array_annealer(sa_config: Dict[str, Any]) -> bool:
+    """工作进程能否直接在共享数组上求解：普通模拟退火且不使用检查点"""
+    return (sa_config["engine"] == "sa" and not sa_config["equivalence_reduction"]
+            and sa_config["checkpoint_interval"] <= 0 and not sa_config["resume"])
+
+
+# 工作进程挂载的问题数据（每个进程只挂载一次）
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(descriptor: Dict[str, Any]) -> None:
+    """工作进程初始化：只挂载共享内存，不复制问题数据"""
+    shm, views, strings = attach_problem(descriptor)
+    _worker_state.update(shm=shm, descriptor=descriptor, views=views, strings=strings)
+
+
+def _worker_objects() -> Tuple[List[Employee], List[Shift]]:
+    """重建员工、班次对象（只在使用没有数组实现的引擎时需要，每个进程最多一次）"""
+    if "employees" not in _worker_state:
+        employees, shifts = build_problem_objects(
+            _worker_state["descriptor"], _worker_state["views"], _worker_state["strings"]
+        )
+        _worker_state.update(employees=employees, shifts=shifts)
+    return _worker_state["employees"], _worker_state["shifts"]
+
+
+def _solve_task(sa_config: Dict[str, Any], cost_params: Dict[str, Any], lower_bound: float,
+                seed: int, run: int) -> Tuple[float, bytes, Dict[str, List[float]]]:
+    """在工作进程中求解一次，返回成本、紧凑编码的分配和收敛数据
+
+    分配编码为按 (班次下标, 职位下标, 员工下标) 展开的 int32 数组字节串。
+    普通模拟退火直接在共享数组上运行；其他引擎（禁忌搜索、大邻域搜索、等价类约简）
+    和检查点需要完整的算法对象，此时重建员工、班次对象，并以 run 作为检查点标记。
+    """
+    random.seed(seed)
+    if uses_array_annealer(sa_config):
+        annealer = ArrayAnnealer(_worker_state["descriptor"], _worker_state["views"],
+                                 sa_config, cost_params, lower_bound)
+        cost, assignments, convergence_data = annealer.simulated_annealing()
+    else:
+        employees, shifts = _worker_objects()
+        sa_config = {**sa_config, "checkpoint_tag": f"run{run}"}
+        scheduler = SchedulingAlgorithm(employees, shifts, sa_config, cost_params)
+        schedule, cost, convergence_data = scheduler.solve()
+        assignments = scheduler.encode_schedule(schedule)
+    flat = array("i")
+    for triple in assignments:
+        flat.extend(triple)
+    return cost, flat.tobytes(), convergence_data
+
+
+def solve_parallel(
+    scheduler: SchedulingAlgorithm,
+    workers: int,
+    runs: Optional[int] = None
+) -> Tuple[List[Tuple[Shift, Dict[str, List[Employee]]]], float, Dict[str, List[float]]]:
+    """多进程独立求解，返回成本最低的结果
+
+    问题数据（连同初始解和成本下界）只在父进程计算并写入一次共享内存，各工作进程挂载后只读使用；
+    每个任务只传递配置和随机种子，结果以紧凑整数编码返回，由父进程解码并重新计算成本。
+    """
+    runs = runs if runs is not None else workers
+    seeds = [random.randrange(2 ** 31) for _ in range(runs)]
+
+    initial = None
+    lower_bound = 0.0
+    if uses_array_annealer(scheduler.sa_config):
+        # 各次求解的初始解相同（贪心、无随机性），在父进程生成一次
+        initial = scheduler.encode_schedule(scheduler.generate_initial_solution())
+        lower_bound = scheduler.compute_lower_bound()
+
+    with SharedProblem(scheduler.employees, scheduler.shifts, scheduler.positions, initial) as problem:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(problem.descriptor,)) as pool:
+            results = pool.starmap(
+                _solve_task,
+                [(scheduler.sa_config, scheduler.cost_params, lower_bound, seed, run)
+                 for run, seed in enumerate(seeds)]
+            )
+
+    _, raw, convergence_data = min(results, key=lambda r: r[0])
+    flat = array("i")
+    flat.frombytes(raw)
+    assignments = [tuple(flat[i:i + 3]) for i in range(0, len(flat), 3)]
+    schedule = scheduler.decode_schedule(assignments)
+    cost = scheduler.calculate_cost(schedule)
+    logger.info(f"并行求解完成，{runs}次求解中最低成本: {cost:.2f}")
+    return schedule, cost, convergence_data
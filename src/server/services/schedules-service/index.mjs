@@ -4,6 +4,7 @@ import scheduleRulesRouter from './schedule-rules.mjs'
 import schedulesRouter from './schedules.mjs'
 import shiftsRouter from './shifts.mjs'
 import shiftAssignmentsRouter from './shift-assignments.mjs'
+import scoringSessionsRouter from './scoring-sessions.mjs'
 
 const app = express()
 const PORT = config.services.schedule.port
@@ -16,6 +17,8 @@ app.use('/rules', scheduleRulesRouter)
 app.use('/shifts', shiftsRouter)
 // 注册班次分配路由
 app.use('/assignments', shiftAssignmentsRouter)
+// 注册评分会话路由（手工调整的增量评分）
+app.use('/scoring-sessions', scoringSessionsRouter)
 // 注册排班表路由
 app.use('', schedulesRouter)
 
@@ -0,0 +1,88 @@
+import { pool } from '../../shared/database/index.mjs'
+
+/**
+ * 查询排班的班次及职位需求，转换为算法需要的格式（严格按照Shift类的定义）
+ */
+export async function loadSchedulerShifts(schedule) {
+  const [shifts] = await pool.query('SELECT * FROM shifts WHERE schedule_id = ?', [schedule.id])
+  return Promise.all(
+    shifts.map(async (shift) => {
+      const [positions] = await pool.query('SELECT * FROM shift_positions WHERE shift_id = ?', [shift.id])
+      const required_positions = {}
+      positions.forEach(pos => {
+        required_positions[String(pos.position)] = Number(pos.count)
+      })
+      return {
+        id: shift.id,
+        day: Number(shift.day),
+        start_time: String(shift.start_time).split(':').slice(0, 2).join(':'),
+        end_time: String(shift.end_time).split(':').slice(0, 2).join(':'),
+        required_positions,
+        store: String(schedule.store_id)
+      }
+    })
+  )
+}
+
+/**
+ * 查询门店员工，转换为算法需要的格式（严格按照Employee类的定义）
+ */
+export async function loadSchedulerEmployees(schedule) {
+  const [employees] = await pool.query('SELECT * FROM employees WHERE store_id = ?', [schedule.store_id])
+  return employees.map(emp => {
+    // 验证并格式化工作日偏好
+    const workday_pref_start = Number(emp.workday_pref_start ?? 0)
+    const workday_pref_end = Number(emp.workday_pref_end ?? 6)
+    if (workday_pref_start < 0 || workday_pref_start > 6 || workday_pref_end < 0 || workday_pref_end > 6) {
+      throw new Error(`员工 ${emp.name} 的工作日偏好超出范围(0-6)`)
+    }
+
+    // 验证并格式化时间偏好
+    const time_pref_start = String(emp.time_pref_start ?? '08:00').split(':').slice(0, 2).join(':')
+    const time_pref_end = String(emp.time_pref_end ?? '20:00').split(':').slice(0, 2).join(':')
+    if (!/^([01]\d|2[0-3]):([0-5]\d)$/.test(time_pref_start) || !/^([01]\d|2[0-3]):([0-5]\d)$/.test(time_pref_end)) {
+      throw new Error(`员工 ${emp.name} 的时间偏好格式错误`)
+    }
+
+    // 验证工作时长
+    const max_daily_hours = Number(emp.max_daily_hours ?? 8)
+    const max_weekly_hours = Number(emp.max_weekly_hours ?? 40)
+    if (max_daily_hours <= 0 || max_daily_hours > 24 || max_weekly_hours <= 0 || max_weekly_hours > 168) {
+      throw new Error(`员工 ${emp.name} 的工作时长超出合理范围`)
+    }
+
+    return {
+      id: emp.id,
+      name: String(emp.name || ''),
+      position: String(emp.position || ''),
+      store: String(schedule.store_id),
+      workday_pref: [workday_pref_start, workday_pref_end],
+      time_pref: [time_pref_start, time_pref_end],
+      max_daily_hours,
+      max_weekly_hours,
+      phone: String(emp.phone || ''),
+      email: String(emp.email || '')
+    }
+  })
+}
+
+/**
+ * 查询用户的排班规则；未找到时返回 null
+ */
+export async function loadScheduleRules(userId) {
+  const [rulesRows] = await pool.query('SELECT * FROM schedule_rules WHERE user_id = ?', [userId])
+  return rulesRows.length ? rulesRows[0] : null
+}
+
+/**
+ * 由排班规则生成成本参数，确保所有数值都是数字类型
+ */
+export function buildCostParams(rules) {
+  return {
+    understaff_penalty: Number(rules.understaff_penalty),
+    workday_violation: Number(rules.workday_violation),
+    time_pref_violation: Number(rules.time_pref_violation),
+    daily_hours_violation: Number(rules.daily_hours_violation),
+    weekly_hours_violation: Number(rules.weekly_hours_violation)
+  }
+}
@@ -4,6 +4,7 @@ import { spawn } from 'child_process'
 import path from 'path'
 import { fileURLToPath } from 'url'
 import fs from 'fs'
+import { loadSchedulerShifts, loadSchedulerEmployees, loadScheduleRules, buildCostParams } from './scheduler-input.mjs'
 
 const router = express.Router()
 
@@ -131,65 +132,11 @@ router.post('/run/:id', async (req, res) => {
     }
     const schedule = schedules[0]
 
-    // 2. 查询班次信息
-    const [shifts] = await pool.query('SELECT * FROM shifts WHERE schedule_id = ?', [id])
-    // 2.1 查询每个班次的职位需求
-    const shiftPositions = await Promise.all(
-      shifts.map(async (shift) => {
-        const [positions] = await pool.query('SELECT * FROM shift_positions WHERE shift_id = ?', [shift.id])
-        // 转换为算法需要的格式，严格按照Shift类的定义
-        const required_positions = {}
-        positions.forEach(pos => {
-          required_positions[String(pos.position)] = Number(pos.count)
-        })
-        return { 
-          day: Number(shift.day),
-          start_time: String(shift.start_time).split(':').slice(0, 2).join(':'),
-          end_time: String(shift.end_time).split(':').slice(0, 2).join(':'),
-          required_positions,
-          store: String(schedule.store_id)
-        }
-      })
-    )
+    // 2. 查询班次信息及每个班次的职位需求
+    const shiftPositions = await loadSchedulerShifts(schedule)
 
     // 3. 查询员工信息
-    const [employees] = await pool.query('SELECT * FROM employees WHERE store_id = ?', [schedule.store_id])
-    
-    // 转换员工数据格式，严格按照Employee类的定义
-    const formattedEmployees = employees.map(emp => {
-      // 验证并格式化工作日偏好
-      const workday_pref_start = Number(emp.workday_pref_start ?? 0)
-      const workday_pref_end = Number(emp.workday_pref_end ?? 6)
-      if (workday_pref_start < 0 || workday_pref_start > 6 || workday_pref_end < 0 || workday_pref_end > 6) {
-        throw new Error(`员工 ${emp.name} 的工作日偏好超出范围(0-6)`)
-      }
-
-      // 验证并格式化时间偏好
-      const time_pref_start = String(emp.time_pref_start ?? '08:00').split(':').slice(0, 2).join(':')
-      const time_pref_end = String(emp.time_pref_end ?? '20:00').split(':').slice(0, 2).join(':')
-      if (!/^([01]\d|2[0-3]):([0-5]\d)$/.test(time_pref_start) || !/^([01]\d|2[0-3]):([0-5]\d)$/.test(time_pref_end)) {
-        throw new Error(`员工 ${emp.name} 的时间偏好格式错误`)
-      }
-
-      // 验证工作时长
-      const max_daily_hours = Number(emp.max_daily_hours ?? 8)
-      const max_weekly_hours = Number(emp.max_weekly_hours ?? 40)
-      if (max_daily_hours <= 0 || max_daily_hours > 24 || max_weekly_hours <= 0 || max_weekly_hours > 168) {
-        throw new Error(`员工 ${emp.name} 的工作时长超出合理范围`)
-      }
-
-      return {
-        name: String(emp.name || ''),
-        position: String(emp.position || ''),
-        store: String(schedule.store_id),
-        workday_pref: [workday_pref_start, workday_pref_end],
-        time_pref: [time_pref_start, time_pref_end],
-        max_daily_hours,
-        max_weekly_hours,
-        phone: String(emp.phone || ''),
-        email: String(emp.email || '')
-      }
-    })
+    const formattedEmployees = await loadSchedulerEmployees(schedule)
 
     // 3.1 查询排班规则参数
     // user_id优先从schedule.created_by获取，否则从header获取
@@ -197,8 +144,8 @@ router.post('/run/:id', async (req, res) => {
     if (!userId) {
       return res.status(400).json({ success: false, error: '无法确定用户ID' })
     }
-    const [rulesRows] = await pool.query('SELECT * FROM schedule_rules WHERE user_id = ?', [userId])
-    if (!rulesRows.length) {
+    const rules = await loadScheduleRules(userId)
+    if (!rules) {
       return res.status(400).json({ success: false, error: '未找到排班规则' })
     }
 
@@ -207,19 +154,13 @@ router.post('/run/:id', async (req, res) => {
       employees: formattedEmployees,
       shifts: shiftPositions,
       sa_config: {
-        initial_temp: Number(rulesRows[0].initial_temp),
-        min_temp: Number(rulesRows[0].min_temp),
-        cooling_rate: Number(rulesRows[0].cooling_rate),
-        iter_per_temp: Number(rulesRows[0].iter_per_temp),
-        iterations: Number(rulesRows[0].iterations)
+        initial_temp: Number(rules.initial_temp),
+        min_temp: Number(rules.min_temp),
+        cooling_rate: Number(rules.cooling_rate),
+        iter_per_temp: Number(rules.iter_per_temp),
+        iterations: Number(rules.iterations)
       },
-      cost_params: {
-        understaff_penalty: Number(rulesRows[0].understaff_penalty),
-        workday_violation: Number(rulesRows[0].workday_violation),
-        time_pref_violation: Number(rulesRows[0].time_pref_violation),
-        daily_hours_violation: Number(rulesRows[0].daily_hours_violation),
-        weekly_hours_violation: Number(rulesRows[0].weekly_hours_violation)
-      }
+      cost_params: buildCostParams(rules)
     }
 
     // 4. 调用排班算法
@@ -309,16 +250,17 @@ router.post('/run/:id', async (req, res) => {
         )
 
         // 6. 存储排班结果
-        if (result.schedule) {
+        if (result.schedule && result.schedule.assignments) {
           // 6.1 删除旧的排班结果
           await pool.query('DELETE FROM schedule_results WHERE schedule_id = ?', [id])
           
           // 6.2 插入新的排班结果
-          const scheduleResults = result.schedule.map(assignment => ({
+          // 分配为 [班次ID, 员工ID, 职位]
+          const scheduleResults = result.schedule.assignments.map(([shift_id, employee_id, position]) => ({
             schedule_id: id,
-            employee_id: assignment.employee_id,
-            shift_id: assignment.shift_id,
-            position: assignment.position
+            employee_id,
+            shift_id,
+            position
           }))
 
           if (scheduleResults.length > 0) {
@@ -0,0 +1,156 @@
+import express from 'express'
+import { pool } from '../../shared/database/index.mjs'
+import { spawn } from 'child_process'
+import readline from 'readline'
+import path from 'path'
+import { fileURLToPath } from 'url'
+import { loadSchedulerShifts, loadSchedulerEmployees, loadScheduleRules, buildCostParams } from './scheduler-input.mjs'
+
+const router = express.Router()
+
+const __filename = fileURLToPath(import.meta.url)
+const __dirname = path.dirname(__filename)
+const pythonScriptPath = path.resolve(__dirname, '../../scheduler/scheduler_api.py')
+
+// 常驻的评分进程（scheduler_api.py --serve），评分会话保存在该进程内
+let scorer = null
+
+/**
+ * 获取常驻评分进程，未启动或已退出时重新启动
+ * 进程逐行读写 JSON 且按顺序响应，因此用先进先出队列匹配请求与响应
+ */
+function getScorer() {
+  if (scorer) return scorer
+
+  const child = spawn('python3', [pythonScriptPath, '--serve'])
+  const pending = []
+  const current = { child, pending }
+
+  readline.createInterface({ input: child.stdout }).on('line', (line) => {
+    const waiter = pending.shift()
+    if (!waiter) return
+    try {
+      const response = JSON.parse(line)
+      if (response.error) waiter.reject(Object.assign(new Error(response.error), { code: response.code }))
+      else waiter.resolve(response)
+    } catch (error) {
+      waiter.reject(error)
+    }
+  })
+  // stderr 为日志输出，只需持续读取避免管道阻塞
+  child.stderr.on('data', () => {})
+
+  const fail = (error) => {
+    if (scorer === current) scorer = null
+    while (pending.length) pending.shift().reject(error)
+  }
+  child.on('error', fail)
+  child.stdin.on('error', fail)
+  child.on('exit', (code) => {
+    console.error('评分进程已退出:', code)
+    fail(new Error('评分进程已退出，评分会话已失效'))
+  })
+
+  scorer = current
+  return scorer
+}
+
+/**
+ * 评分进程返回的错误类型对应的 HTTP 状态码；进程退出等其他错误为 500
+ */
+const SCORER_ERROR_STATUS = {
+  session_not_found: 404,
+  invalid_request: 400
+}
+
+function scorerErrorStatus(error) {
+  return SCORER_ERROR_STATUS[error.code] ?? 500
+}
+
+/**
+ * 向评分进程发送一个请求并等待响应
+ */
+function callScorer(request) {
+  const { child, pending } = getScorer()
+  return new Promise((resolve, reject) => {
+    pending.push({ resolve, reject })
+    child.stdin.write(JSON.stringify(request) + '\n')
+  })
+}
+
+/**
+ * 创建评分会话：载入排班的员工、班次和分配，返回会话ID、成本和违规统计
+ * 请求体: { schedule_id, assignments? }，assignments 为 [班次ID, 员工ID, 职位]，
+ * 省略时使用已保存的排班结果
+ */
+router.post('/', async (req, res) => {
+  const { schedule_id, assignments } = req.body
+  if (!schedule_id) return res.status(400).json({ success: false, error: '缺少schedule_id' })
+  try {
+    const [schedules] = await pool.query('SELECT * FROM schedules WHERE id = ?', [schedule_id])
+    if (schedules.length === 0) {
+      return res.status(404).json({ success: false, error: '排班不存在' })
+    }
+    const schedule = schedules[0]
+
+    const userId = schedule.created_by || req.headers['x-user-id']
+    if (!userId) {
+      return res.status(400).json({ success: false, error: '无法确定用户ID' })
+    }
+    const rules = await loadScheduleRules(userId)
+    if (!rules) {
+      return res.status(400).json({ success: false, error: '未找到排班规则' })
+    }
+
+    let sessionAssignments = assignments
+    if (!Array.isArray(sessionAssignments)) {
+      const [rows] = await pool.query('SELECT * FROM schedule_results WHERE schedule_id = ?', [schedule_id])
+      sessionAssignments = rows.map(row => [row.shift_id, row.employee_id, row.position])
+    }
+
+    const result = await callScorer({
+      action: 'open_session',
+      employees: await loadSchedulerEmployees(schedule),
+      shifts: await loadSchedulerShifts(schedule),
+      schedule: { assignments: sessionAssignments },
+      cost_params: buildCostParams(rules)
+    })
+    res.status(201).json({ success: true, data: result })
+  } catch (error) {
+    console.error('创建评分会话失败:', error)
+    res.status(scorerErrorStatus(error)).json({ success: false, error: error.message })
+  }
+})
+
+/**
+ * 评估一批手工调整（拖拽增加、移除、移动、交换员工）
+ * 请求体: { edits: [...], apply?: boolean }
+ */
+router.post('/:sessionId/edits', async (req, res) => {
+  const { edits, apply } = req.body
+  if (!Array.isArray(edits)) return res.status(400).json({ success: false, error: '缺少edits' })
+  try {
+    const result = await callScorer({ action: 'score', session_id: req.params.sessionId, edits, apply: Boolean(apply) })
+    res.json({ success: true, data: result })
+  } catch (error) {
+    // 只有会话不存在或已过期时返回 404，前端据此重新创建会话
+    const status = scorerErrorStatus(error)
+    if (status === 500) console.error('评估调整失败:', error)
+    res.status(status).json({ success: false, error: error.message })
+  }
+})
+
+/**
+ * 关闭评分会话
+ */
+router.delete('/:sessionId', async (req, res) => {
+  try {
+    const result = await callScorer({ action: 'close_session', session_id: req.params.sessionId })
+    res.json({ success: true, data: result })
+  } catch (error) {
+    console.error('关闭评分会话失败:', error)
+    res.status(scorerErrorStatus(error)).json({ success: false, error: error.message })
+  }
+})
+
+export default router